@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Shared helpers for the binary ClientLocalizationPose stream of ROKIT Locator
+
+import asyncio
+import math
+import struct
+import threading
+import time
+from datetime import datetime
+
+# ClientLocalizationPoseDatagram data structure (see API manual)
+unpacker = struct.Struct("<ddQiQQddddddddddddddQddd")
+FRAME_SIZE = unpacker.size  # 188 bytes
+# fields of ClientLocalizationPoseDatagram in the order of unpacker
+DATAGRAM_FIELDS = (
+    "age",
+    "timestamp",
+    "unique_id",
+    "localization_state",
+    "error_flags",
+    "info_flags",
+    "x",
+    "y",
+    "yaw",
+    "cov_xx",
+    "cov_xy",
+    "cov_xyaw",
+    "cov_yy",
+    "cov_yyaw",
+    "cov_yawyaw",
+    "z",
+    "qw",
+    "qx",
+    "qy",
+    "qz",
+    "epoch",
+    "odo_x",
+    "odo_y",
+    "odo_yaw",
+)
+# age, timestamp, uniqueId, localization_state at the head of every datagram
+header = struct.Struct("<ddQi")
+
+
+class PoseStreamReader:
+    """Reassemble whole ClientLocalizationPoseDatagram frames from a TCP byte stream.
+
+    Bytes are received with recv_into() into one preallocated buffer, so no
+    memory is allocated per datagram. A short read is kept until the rest of
+    the frame arrives, and several frames in one TCP segment are all yielded.
+    If a frame fails the plausibility check the reader slides forward byte by
+    byte until it finds the next valid frame and counts a resync.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.buffer = bytearray(FRAME_SIZE * capacity)
+        self._view = memoryview(self.buffer)
+        self._start = 0  # first unread byte
+        self._end = 0  # end of received bytes
+        self._in_sync = True
+        self.frame_count = 0
+        self.resyncs = 0
+        self._rate_frames = 0
+        self._rate_tic = time.monotonic()
+
+    def reset(self):
+        """Drop buffered bytes, e.g. after reconnecting to Locator"""
+        self._start = 0
+        self._end = 0
+        self._in_sync = True
+
+    def free_view(self) -> memoryview:
+        """Return the writable tail of the buffer, compacting it first if needed"""
+        if len(self.buffer) - self._end < FRAME_SIZE:
+            pending = self._end - self._start
+            self._view[:pending] = self._view[self._start : self._end]
+            self._start = 0
+            self._end = pending
+        return self._view[self._end :]
+
+    def advance(self, nbytes: int):
+        """Account for nbytes written into free_view()"""
+        self._end += nbytes
+
+    def recv_into(self, sock) -> int:
+        """Receive from a blocking socket, return the number of bytes, 0 on EOF"""
+        nbytes = sock.recv_into(self.free_view())
+        self._end += nbytes
+        return nbytes
+
+    def _plausible(self, offset: int) -> bool:
+        age, timestamp, unique_id, state = header.unpack_from(self.buffer, offset)
+        return (
+            0.0 <= age < 1e6
+            and 0.0 < timestamp < 1e11
+            and math.isfinite(timestamp)
+            and 0 <= state < 256
+        )
+
+    def pending_frames(self):
+        """Yield buffer offsets of the complete frames received so far.
+
+        An offset is only valid until the next call of recv_into()/free_view().
+        """
+        while self._end - self._start >= FRAME_SIZE:
+            offset = self._start
+            if not self._plausible(offset):
+                if self._in_sync:
+                    self._in_sync = False
+                    self.resyncs += 1
+                self._start += 1
+                continue
+            self._in_sync = True
+            self._start += FRAME_SIZE
+            self.frame_count += 1
+            self._rate_frames += 1
+            yield offset
+
+    def read_frames(self, sock):
+        """Yield offsets of frames read from a blocking socket until it closes"""
+        while True:
+            if not self.recv_into(sock):
+                raise ConnectionError("Locator closed the pose stream")
+            yield from self.pending_frames()
+
+    def unpack(self, offset: int) -> tuple:
+        return unpacker.unpack_from(self.buffer, offset)
+
+    def frame(self, offset: int) -> memoryview:
+        """Zero-copy view of the raw frame at offset"""
+        return self._view[offset : offset + FRAME_SIZE]
+
+    def stats(self, reset: bool = True) -> dict:
+        """Frame counters; fps is averaged over the time since the last reset"""
+        toc = time.monotonic()
+        elapsed = toc - self._rate_tic
+        fps = self._rate_frames / elapsed if elapsed > 0 else 0.0
+        if reset:
+            self._rate_frames = 0
+            self._rate_tic = toc
+        return {
+            "frames": self.frame_count,
+            "resyncs": self.resyncs,
+            "fps": round(fps, 1),
+        }
+
+
+class PoseSnapshot:
+    """One received pose; the timestamp is only formatted when it is logged"""
+
+    __slots__ = ("seq", "timestamp", "x", "y", "yaw", "localization_state")
+
+    def __init__(self, seq, timestamp, x, y, yaw, localization_state):
+        self.seq = seq
+        self.timestamp = timestamp  # epoch seconds reported by Locator
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+        self.localization_state = localization_state
+
+    @classmethod
+    def from_datagram(cls, seq: int, unpacked_data: tuple):
+        return cls(
+            seq,
+            unpacked_data[1],
+            unpacked_data[6],
+            unpacked_data[7],
+            unpacked_data[8],
+            unpacked_data[3],
+        )
+
+    def is_localized(self) -> bool:
+        return self.localization_state >= 2
+
+    def as_dict(self) -> dict:
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).strftime(
+                "%d-%m-%Y-%H-%M-%S"
+            ),
+            "x": self.x,
+            "y": self.y,
+            "yaw": self.yaw,
+            "localization_state": self.localization_state,
+        }
+
+    def __repr__(self):
+        return f"PoseSnapshot(seq={self.seq}, {self.as_dict()})"
+
+
+class LatestPose:
+    """Holder of the newest PoseSnapshot, written by a single pose thread.
+
+    Readers take `latest` without locking; publishing replaces the reference in
+    one assignment. Every snapshot carries a sequence number, and wait_newer()
+    blocks until a pose newer than a known sequence number has arrived.
+    """
+
+    def __init__(self):
+        self.latest = None
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, unpacked_data: tuple) -> PoseSnapshot:
+        self._seq += 1
+        snapshot = PoseSnapshot.from_datagram(self._seq, unpacked_data)
+        self.latest = snapshot
+        with self._cond:
+            self._cond.notify_all()
+        return snapshot
+
+    def wait_newer(self, seq: int, timeout: float = None) -> PoseSnapshot:
+        """Return a snapshot with a sequence number above seq, None on timeout"""
+        snapshot = self.latest
+        if snapshot is not None and snapshot.seq > seq:
+            return snapshot
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.latest is not None and self.latest.seq > seq, timeout
+            )
+        snapshot = self.latest
+        if snapshot is not None and snapshot.seq > seq:
+            return snapshot
+        return None
+
+
+class AsyncLatestPose:
+    """LatestPose for coroutines running in one event loop"""
+
+    def __init__(self):
+        self.latest = None
+        self._seq = 0
+        self._event = asyncio.Event()
+
+    def publish(self, unpacked_data: tuple) -> PoseSnapshot:
+        self._seq += 1
+        snapshot = PoseSnapshot.from_datagram(self._seq, unpacked_data)
+        self.latest = snapshot
+        # set() wakes every current waiter, clear() prepares for the next pose
+        self._event.set()
+        self._event.clear()
+        return snapshot
+
+    async def wait_newer(self, seq: int, timeout: float = None) -> PoseSnapshot:
+        """Return a snapshot with a sequence number above seq, None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.latest is None or self.latest.seq <= seq:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self.latest
+
+
+class PoseDeadband:
+    """Decide when the last pose (seed 0) has to be written again.
+
+    A pose is due when it moved beyond the translational (meter) or rotational
+    (radian) deadband, or as a heartbeat when nothing was written for
+    max_interval seconds. Writes are never closer together than min_interval.
+    """
+
+    def __init__(
+        self,
+        xy: float = 0.005,
+        yaw: float = 0.0087,  # 0.5 degrees
+        min_interval: float = 0.1,
+        max_interval: float = 10.0,
+    ):
+        self.xy = xy
+        self.yaw = yaw
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.written = None
+        self.written_at = -math.inf
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            xy=config["seed0_deadband_xy"],
+            yaw=config["seed0_deadband_yaw"],
+            min_interval=config["seed0_min_interval"],
+            max_interval=config["seed0_max_interval"],
+        )
+
+    def moved(self, pose) -> bool:
+        last = self.written
+        return (
+            last is None
+            or abs(pose.x - last.x) > self.xy
+            or abs(pose.y - last.y) > self.xy
+            or abs(math.remainder(pose.yaw - last.yaw, math.tau)) > self.yaw
+        )
+
+    def due(self, pose, now: float) -> bool:
+        return self.moved(pose) or now - self.written_at >= self.max_interval
+
+    def hold_off(self, now: float) -> float:
+        """Seconds to wait before min_interval allows the next write"""
+        return max(0.0, self.written_at + self.min_interval - now)
+
+    def mark_written(self, pose, now: float):
+        self.written = pose
+        self.written_at = now
+
+    def next_pose(self, latest_pose: LatestPose, seq: int) -> PoseSnapshot:
+        """Block until a localized pose newer than seq is due to be written.
+
+        Returns None if no new pose arrived within max_interval.
+        """
+        while True:
+            pose = latest_pose.wait_newer(seq, timeout=self.max_interval)
+            if pose is None:
+                return None
+            seq = pose.seq
+            if not pose.is_localized() or not self.due(pose, time.monotonic()):
+                continue
+            hold_off = self.hold_off(time.monotonic())
+            if hold_off > 0:
+                time.sleep(hold_off)
+                # write the newest pose, not the one that triggered the write
+                pose = latest_pose.latest
+                if not pose.is_localized():
+                    seq = pose.seq
+                    continue
+            return pose
+
+    async def next_pose_async(
+        self, latest_pose: AsyncLatestPose, seq: int
+    ) -> PoseSnapshot:
+        """Coroutine version of next_pose()"""
+        while True:
+            pose = await latest_pose.wait_newer(seq, timeout=self.max_interval)
+            if pose is None:
+                return None
+            seq = pose.seq
+            if not pose.is_localized() or not self.due(pose, time.monotonic()):
+                continue
+            hold_off = self.hold_off(time.monotonic())
+            if hold_off > 0:
+                await asyncio.sleep(hold_off)
+                pose = latest_pose.latest
+                if not pose.is_localized():
+                    seq = pose.seq
+                    continue
+            return pose
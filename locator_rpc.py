@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# JSON RPC client of ROKIT Locator that keeps its HTTP connection and session
+
+import asyncio
+import logging
+import time
+
+import requests
+
+try:
+    import aiohttp
+except ImportError:  # only needed by AsyncLocatorRpcClient
+    aiohttp = None
+
+
+class RpcError(Exception):
+    """A JSON RPC call to ROKIT Locator failed"""
+
+
+class RpcMetrics:
+    """Latency of JSON RPC calls per method, in milliseconds"""
+
+    def __init__(self):
+        self.methods = {}
+
+    def record(self, method: str, seconds: float):
+        ms = seconds * 1000.0
+        m = self.methods.get(method)
+        if m is None:
+            self.methods[method] = {
+                "calls": 1,
+                "last": ms,
+                "min": ms,
+                "max": ms,
+                "total": ms,
+            }
+            return
+        m["calls"] += 1
+        m["last"] = ms
+        m["min"] = min(m["min"], ms)
+        m["max"] = max(m["max"], ms)
+        m["total"] += ms
+
+    def summary(self) -> dict:
+        return {
+            method: {
+                "calls": m["calls"],
+                "last_ms": round(m["last"], 1),
+                "avg_ms": round(m["total"] / m["calls"], 1),
+                "min_ms": round(m["min"], 1),
+                "max_ms": round(m["max"], 1),
+            }
+            for method, m in self.methods.items()
+        }
+
+
+class _SessionCache:
+    """Bookkeeping shared by the blocking and the asyncio client"""
+
+    def __init__(self, url, user_name, password, session_timeout, renew_margin):
+        self.url = url
+        self.user_name = user_name
+        self.password = password
+        self.session_timeout = session_timeout  # seconds, sent with sessionLogin
+        self.renew_margin = renew_margin  # log in again this long before expiry
+        self.session_id = ""
+        self.expires = 0.0
+        self.metrics = RpcMetrics()
+        self._id = 0
+
+    def _payload(self, method: str, query: dict) -> dict:
+        payload = {
+            "id": self._id,
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": {"query": query},
+        }
+        self._id += 1
+        return payload
+
+    def _login_query(self) -> dict:
+        return {
+            "timeout": {  # timeout, not timestamp
+                "valid": True,
+                "time": self.session_timeout,  # Integer64
+                "resolution": 1,  # real_time = time / resolution
+            },
+            "userName": self.user_name,
+            "password": self.password,
+        }
+
+    def _cached_session(self) -> str:
+        if self.session_id and time.monotonic() < self.expires:
+            return self.session_id
+        return ""
+
+    def _store_session(self, response: dict, logged_in_at: float) -> str:
+        session_id = response.get("sessionId", "")
+        if not session_id:
+            raise RpcError(f"Locator client session login failed, {response}")
+        self.session_id = session_id
+        self.expires = logged_in_at + self.session_timeout - self.renew_margin
+        return session_id
+
+    def _forget_session(self):
+        self.session_id = ""
+        self.expires = 0.0
+
+    @staticmethod
+    def _seed_query(session_id, x, y, a, enforceSeed, uncertainSeed) -> dict:
+        return {
+            "sessionId": session_id,
+            "enforceSeed": enforceSeed,
+            "uncertainSeed": uncertainSeed,
+            "seedPose": {"x": x, "y": y, "a": a},
+        }
+
+
+class LocatorRpcClient(_SessionCache):
+    """Blocking JSON RPC client with a keep-alive connection and a cached session.
+
+    The session ID from sessionLogin is reused until shortly before the session
+    timeout expires. If a call with a cached session is refused, the client logs
+    in again and repeats the call once.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        user_name: str,
+        password: str,
+        session_timeout: int = 60,
+        renew_margin: float = 5.0,
+        timeout: float = 5.0,
+    ):
+        super().__init__(url, user_name, password, session_timeout, renew_margin)
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def call(self, method: str, query: dict) -> dict:
+        """Post one JSON RPC request and return result.response"""
+        payload = self._payload(method, query)
+        logging.debug(payload)
+        tic = time.perf_counter()
+        try:
+            response = self.http.post(url=self.url, json=payload, timeout=self.timeout)
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise RpcError(f"{method}: {e!r}") from e
+        finally:
+            self.metrics.record(method, time.perf_counter() - tic)
+        logging.debug(result)
+        try:
+            return result["result"]["response"]
+        except (KeyError, TypeError) as e:
+            raise RpcError(f"{method}: unexpected response {result}") from e
+
+    def login(self) -> str:
+        logged_in_at = time.monotonic()
+        return self._store_session(
+            self.call("sessionLogin", self._login_query()), logged_in_at
+        )
+
+    def logout(self):
+        if self.session_id:
+            try:
+                self.call("sessionLogout", {"sessionId": self.session_id})
+            finally:
+                self._forget_session()
+
+    def call_with_session(self, method: str, query: dict) -> dict:
+        """Call a method that takes "sessionId" in its query"""
+        session_id = self._cached_session()
+        cached = bool(session_id)
+        if not cached:
+            session_id = self.login()
+        response = self.call(method, dict(query, sessionId=session_id))
+        if response.get("responseCode", 0) != 0 and cached:
+            # the session may have been dropped by Locator, log in again
+            logging.info(f"{method} refused with a cached session, {response}")
+            self._forget_session()
+            response = self.call(method, dict(query, sessionId=self.login()))
+        return response
+
+    def set_seed(self, x, y, a, enforceSeed=False, uncertainSeed=False) -> bool:
+        logging.debug(f"x={x}, y={y}, a={a}")
+        response = self.call_with_session(
+            "clientLocalizationSetSeed",
+            self._seed_query(None, x, y, a, enforceSeed, uncertainSeed),
+        )
+        return response.get("responseCode") == 0
+
+    def close(self):
+        try:
+            self.logout()
+        except RpcError as e:
+            logging.warning(e)
+        self.http.close()
+
+
+class AsyncLocatorRpcClient(_SessionCache):
+    """LocatorRpcClient for asyncio, posting through a shared aiohttp.ClientSession"""
+
+    def __init__(
+        self,
+        http,
+        url: str,
+        user_name: str,
+        password: str,
+        session_timeout: int = 60,
+        renew_margin: float = 5.0,
+        timeout: float = 5.0,
+    ):
+        super().__init__(url, user_name, password, session_timeout, renew_margin)
+        self.timeout = timeout
+        self.http = http
+
+    async def call(self, method: str, query: dict) -> dict:
+        payload = self._payload(method, query)
+        logging.debug(payload)
+        tic = time.perf_counter()
+        try:
+            async with self.http.post(
+                self.url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
+                result = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise RpcError(f"{method}: {e!r}") from e
+        finally:
+            self.metrics.record(method, time.perf_counter() - tic)
+        logging.debug(result)
+        try:
+            return result["result"]["response"]
+        except (KeyError, TypeError) as e:
+            raise RpcError(f"{method}: unexpected response {result}") from e
+
+    async def login(self) -> str:
+        logged_in_at = time.monotonic()
+        return self._store_session(
+            await self.call("sessionLogin", self._login_query()), logged_in_at
+        )
+
+    async def logout(self):
+        if self.session_id:
+            try:
+                await self.call("sessionLogout", {"sessionId": self.session_id})
+            finally:
+                self._forget_session()
+
+    async def call_with_session(self, method: str, query: dict) -> dict:
+        session_id = self._cached_session()
+        cached = bool(session_id)
+        if not cached:
+            session_id = await self.login()
+        response = await self.call(method, dict(query, sessionId=session_id))
+        if response.get("responseCode", 0) != 0 and cached:
+            logging.info(f"{method} refused with a cached session, {response}")
+            self._forget_session()
+            response = await self.call(
+                method, dict(query, sessionId=await self.login())
+            )
+        return response
+
+    async def set_seed(self, x, y, a, enforceSeed=False, uncertainSeed=False) -> bool:
+        logging.debug(f"x={x}, y={y}, a={a}")
+        response = await self.call_with_session(
+            "clientLocalizationSetSeed",
+            self._seed_query(None, x, y, a, enforceSeed, uncertainSeed),
+        )
+        return response.get("responseCode") == 0
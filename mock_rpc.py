@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Stand-in for the JSON RPC port of ROKIT Locator with the methods used by the
+# bridges: sessionLogin, sessionLogout and clientLocalizationSetSeed. Latency,
+# errors and session expiry can be injected. GET /stats returns the calls and
+# seeds received so far.
+#
+# python mock_rpc.py --port 8080 --latency 0.02 --error_rate 0.05
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+RESPONSE_OK = 0
+# codes of the stand-in, the bridges only check for 0
+RESPONSE_INVALID_SESSION = 1
+RESPONSE_INJECTED_ERROR = 2
+
+
+class MockLocatorRpc:
+    """JSON RPC methods of Locator with injectable faults.
+
+    latency, jitter  seconds added to every call, uniformly up to +jitter
+    error_rate       share of calls answered with HTTP 500
+    refuse_rate      share of calls answered with a non-zero responseCode
+    session_lifetime seconds a session is valid, the timeout of sessionLogin
+                     if None
+    expire_every     drop all sessions after this many calls, 0 for never
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        refuse_rate: float = 0.0,
+        session_lifetime: float = None,
+        expire_every: int = 0,
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.refuse_rate = refuse_rate
+        self.session_lifetime = session_lifetime
+        self.expire_every = expire_every
+        self.random = random.Random(seed)
+        self.sessions = {}  # sessionId: expiry, monotonic seconds
+        self.calls = {}  # method: count
+        self.errors = 0
+        self.seeds = []  # (time, query) of every accepted clientLocalizationSetSeed
+        self.methods = {
+            "sessionLogin": self.session_login,
+            "sessionLogout": self.session_logout,
+            "clientLocalizationSetSeed": self.set_seed,
+        }
+
+    def _session_valid(self, query: dict) -> bool:
+        expiry = self.sessions.get(query.get("sessionId"))
+        if expiry is None:
+            return False
+        if time.monotonic() >= expiry:
+            del self.sessions[query["sessionId"]]
+            return False
+        return True
+
+    def session_login(self, query: dict) -> dict:
+        lifetime = self.session_lifetime
+        if lifetime is None:
+            timeout = query.get("timeout", {})
+            lifetime = timeout.get("time", 60) / timeout.get("resolution", 1)
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = time.monotonic() + lifetime
+        return {"responseCode": RESPONSE_OK, "sessionId": session_id}
+
+    def session_logout(self, query: dict) -> dict:
+        if self.sessions.pop(query.get("sessionId"), None) is None:
+            return {"responseCode": RESPONSE_INVALID_SESSION}
+        return {"responseCode": RESPONSE_OK}
+
+    def set_seed(self, query: dict) -> dict:
+        if not self._session_valid(query):
+            return {"responseCode": RESPONSE_INVALID_SESSION}
+        self.seeds.append((time.time(), query))
+        return {"responseCode": RESPONSE_OK}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        method = payload.get("method")
+        self.calls[method] = self.calls.get(method, 0) + 1
+        delay = self.latency + self.random.uniform(0.0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.expire_every and sum(self.calls.values()) % self.expire_every == 0:
+            self.sessions.clear()
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text="injected error")
+        if method not in self.methods:
+            return web.json_response(
+                {
+                    "jsonrpc": "2.0",
+                    "id": payload.get("id"),
+                    "error": {"code": -32601, "message": "Method not found"},
+                }
+            )
+        if self.random.random() < self.refuse_rate:
+            self.errors += 1
+            response = {"responseCode": RESPONSE_INJECTED_ERROR}
+        else:
+            response = self.methods[method](payload["params"]["query"])
+        return web.json_response(
+            {
+                "jsonrpc": "2.0",
+                "id": payload.get("id"),
+                "result": {"response": response},
+            }
+        )
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": self.errors,
+            "sessions": len(self.sessions),
+            "seeds": [
+                {"time": t, **{k: v for k, v in q.items() if k != "sessionId"}}
+                for t, q in self.seeds
+            ],
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str, port: int) -> web.AppRunner:
+        """Serve in the running event loop; stop with `await runner.cleanup()`"""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="a stand-in for the JSON RPC port of ROKIT Locator",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--host", type=str, default="", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every call"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="up to this many seconds added randomly on top of --latency",
+    )
+    parser.add_argument(
+        "--error_rate",
+        type=float,
+        default=0.0,
+        help="share of calls answered with HTTP 500",
+    )
+    parser.add_argument(
+        "--refuse_rate",
+        type=float,
+        default=0.0,
+        help="share of calls answered with a non-zero responseCode",
+    )
+    parser.add_argument(
+        "--session_lifetime",
+        type=float,
+        default=None,
+        help="seconds a session is valid, the timeout requested by sessionLogin by default",
+    )
+    parser.add_argument(
+        "--expire_every",
+        type=int,
+        default=0,
+        help="drop all sessions after this many calls, 0: never",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed of the fault injection"
+    )
+    args = parser.parse_args()
+
+    format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
+    logging.basicConfig(format=format, level=logging.INFO, datefmt="%Y-%m-%d %H:%M:%S")
+
+    mock = MockLocatorRpc(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        refuse_rate=args.refuse_rate,
+        session_lifetime=args.session_lifetime,
+        expire_every=args.expire_every,
+        seed=args.seed,
+    )
+    web.run_app(mock.app(), host=args.host or None, port=args.port)
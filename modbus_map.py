@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Holding register map of the seeds in a Modbus PLC, read and written in as few
+# transactions as possible.
+
+import logging
+import math
+from array import array
+
+from pymodbus.exceptions import ModbusException
+from pymodbus.pdu import ExceptionResponse
+
+from seed_codec import decode_bits, decode_pose, encode_pose
+from seed_codec import flag_position, rising_edges
+
+MAX_READ_REGISTERS = 125  # function 3, read holding registers
+MAX_WRITE_REGISTERS = 123  # function 16, write multiple registers
+POSE_REGISTERS = 6  # x, y, yaw as float32
+
+
+def plan_blocks(ranges, max_count: int, max_gap: int = 0) -> list:
+    """Merge (start, count) register ranges into as few blocks as possible.
+
+    Ranges closer than max_gap registers are merged as long as a block stays
+    within max_count registers; longer ranges are split.
+    """
+    blocks = []
+    for start, count in sorted(r for r in ranges if r[1] > 0):
+        end = start + count
+        if blocks:
+            b_start, b_count = blocks[-1]
+            b_end = b_start + b_count
+            if start - b_end <= max_gap and max(end, b_end) - b_start <= max_count:
+                blocks[-1] = (b_start, max(end, b_end) - b_start)
+                continue
+            if start < b_end:  # overlap with a full block, keep the rest
+                start = b_end
+                if start >= end:
+                    continue
+        while end - start > max_count:
+            blocks.append((start, max_count))
+            start += max_count
+        blocks.append((start, end - start))
+    return blocks
+
+
+def _response_ok(rr, what: str) -> bool:
+    if rr.isError() or isinstance(rr, ExceptionResponse):
+        logging.warning(f"{what}: Modbus error {rr}")
+        return False
+    return True
+
+
+class SeedRegisterMap:
+    """Shadow copy of the seed control bits and poses in the holding registers.
+
+    poll() refreshes the whole shadow with the planned reads, normally a single
+    transaction; bits() and pose() then decode from the shadow without talking
+    to the PLC. Writes are staged and sent by flush(), adjacent registers in one
+    write_registers request.
+
+    ack() clears teachSeed/setSeed flags by touching only the registers
+    holding them: with mask_write through function 22 (mask write register)
+    per register, otherwise by reading those registers and writing them back
+    without the flags in one request.
+    """
+
+    def __init__(
+        self,
+        bits_starting_addr: int,
+        poses_starting_addr: int,
+        seed_num: int,
+        byte_order: str,
+        word_order: str,
+        max_gap: int = 16,
+        mask_write: bool = False,
+    ):
+        self.bits_starting_addr = bits_starting_addr
+        self.poses_starting_addr = poses_starting_addr
+        self.seed_num = seed_num
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.mask_write = mask_write
+        self.bits_count = math.ceil(seed_num * 4 / 16)
+        ranges = [
+            (bits_starting_addr, self.bits_count),
+            (poses_starting_addr, seed_num * POSE_REGISTERS),
+        ]
+        self.start = min(start for start, _ in ranges)
+        end = max(start + count for start, count in ranges)
+        self.shadow = array("H", bytes(2 * (end - self.start)))
+        self.reads = plan_blocks(ranges, MAX_READ_REGISTERS, max_gap)
+        self._dirty = []
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            config["bits_starting_addr"],
+            config["poses_starting_addr"],
+            config["seed_num"],
+            config["byte_order"],
+            config["word_order"],
+            config["max_read_gap"],
+            bool(config["mask_write"]),
+        )
+
+    def _slice(self, address: int, count: int):
+        offset = address - self.start
+        return self.shadow[offset : offset + count]
+
+    def _store(self, address: int, registers):
+        offset = address - self.start
+        self.shadow[offset : offset + len(registers)] = array("H", registers)
+
+    # decoding from the shadow
+
+    def bit_registers(self):
+        return self._slice(self.bits_starting_addr, self.bits_count)
+
+    def bits(self) -> list:
+        """[enforceSeed, uncertainSeed, teachSeed, setSeed] of every seed"""
+        return decode_bits(self.bit_registers())
+
+    def rising(self, previous, flag: int) -> list:
+        """Seeds whose flag is set now but was not in the previous bit registers"""
+        return [
+            i
+            for i in rising_edges(previous, self.bit_registers(), flag)
+            if i < self.seed_num
+        ]
+
+    def previous_bits(self, unhandled=()):
+        """Bit registers to compare the next poll with.
+
+        The flags of unhandled (seed, flag) pairs are cleared, so they are
+        rising edges again in the next cycle.
+        """
+        registers = self.bit_registers()
+        for i, flag in unhandled:
+            register, mask = flag_position(i, flag)
+            registers[register] &= ~mask
+        return registers
+
+    def pose_address(self, i: int) -> int:
+        return self.poses_starting_addr + i * POSE_REGISTERS
+
+    def pose(self, i: int) -> list:
+        """[x, y, yaw] of seed i"""
+        return decode_pose(
+            self._slice(self.pose_address(i), POSE_REGISTERS).tolist(),
+            self.byte_order,
+            self.word_order,
+        )
+
+    def flag_address(self, i: int, flag: int) -> tuple:
+        """Register address and bit mask of a flag of seed i"""
+        register, mask = flag_position(i, flag)
+        return self.bits_starting_addr + register, mask
+
+    # staging writes
+
+    def stage(self, address: int, registers):
+        self._store(address, registers)
+        self._dirty.append((address, len(registers)))
+
+    def stage_pose(self, i: int, pose):
+        self.stage(
+            self.pose_address(i), encode_pose(pose, self.byte_order, self.word_order)
+        )
+
+    def _writes(self) -> list:
+        writes = [
+            (start, self._slice(start, count).tolist())
+            for start, count in plan_blocks(self._dirty, MAX_WRITE_REGISTERS)
+        ]
+        self._dirty = []
+        return writes
+
+    # transactions
+
+    def poll(self, client) -> bool:
+        """Refresh the shadow from the PLC"""
+        for start, count in self.reads:
+            try:
+                rr = client.read_holding_registers(start, count=count)
+            except ModbusException as exc:
+                logging.warning(f"Received ModbusException({exc}) from library")
+                return False
+            if not _response_ok(rr, f"read {count} registers at {start}"):
+                return False
+            self._store(start, rr.registers)
+        return True
+
+    def flush(self, client) -> bool:
+        """Send the staged registers to the PLC"""
+        for start, registers in self._writes():
+            try:
+                rr = client.write_registers(start, registers)
+            except ModbusException as exc:
+                logging.warning(f"Received ModbusException({exc}) from library")
+                return False
+            if not _response_ok(rr, f"write {len(registers)} registers at {start}"):
+                return False
+        return True
+
+    async def poll_async(self, client) -> bool:
+        for start, count in self.reads:
+            try:
+                rr = await client.read_holding_registers(start, count=count)
+            except ModbusException as exc:
+                logging.warning(f"Received ModbusException({exc}) from library")
+                return False
+            if not _response_ok(rr, f"read {count} registers at {start}"):
+                return False
+            self._store(start, rr.registers)
+        return True
+
+    async def flush_async(self, client) -> bool:
+        for start, registers in self._writes():
+            try:
+                rr = await client.write_registers(start, registers)
+            except ModbusException as exc:
+                logging.warning(f"Received ModbusException({exc}) from library")
+                return False
+            if not _response_ok(rr, f"write {len(registers)} registers at {start}"):
+                return False
+        return True
+
+    def _clear_masks(self, acks) -> dict:
+        masks = {}
+        for i, flag in acks:
+            address, mask = self.flag_address(i, flag)
+            masks[address] = masks.get(address, 0) | mask
+        return masks
+
+    def ack(self, client, acks) -> bool:
+        """Clear the flags of (seed, flag) pairs in the PLC.
+
+        Registers that are not touched by any pair are never written.
+        """
+        masks = self._clear_masks(acks)
+        if not masks:
+            return True
+        try:
+            if self.mask_write:
+                for address, mask in masks.items():
+                    rr = client.mask_write_register(
+                        address=address, and_mask=0xFFFF & ~mask, or_mask=0
+                    )
+                    if not _response_ok(rr, f"mask write register {address}"):
+                        return False
+                    self._store(address, [self._slice(address, 1)[0] & ~mask])
+                return True
+            start = min(masks)
+            count = max(masks) - start + 1
+            rr = client.read_holding_registers(start, count=count)
+            if not _response_ok(rr, f"read {count} registers at {start}"):
+                return False
+            registers = self._cleared(start, rr.registers, masks)
+            # the PLC may have cleared the flags itself meanwhile
+            if registers != list(rr.registers):
+                rr = client.write_registers(start, registers)
+                if not _response_ok(rr, f"write {count} registers at {start}"):
+                    return False
+        except ModbusException as exc:
+            logging.warning(f"Received ModbusException({exc}) from library")
+            return False
+        self._store(start, registers)
+        return True
+
+    async def ack_async(self, client, acks) -> bool:
+        masks = self._clear_masks(acks)
+        if not masks:
+            return True
+        try:
+            if self.mask_write:
+                for address, mask in masks.items():
+                    rr = await client.mask_write_register(
+                        address=address, and_mask=0xFFFF & ~mask, or_mask=0
+                    )
+                    if not _response_ok(rr, f"mask write register {address}"):
+                        return False
+                    self._store(address, [self._slice(address, 1)[0] & ~mask])
+                return True
+            start = min(masks)
+            count = max(masks) - start + 1
+            rr = await client.read_holding_registers(start, count=count)
+            if not _response_ok(rr, f"read {count} registers at {start}"):
+                return False
+            registers = self._cleared(start, rr.registers, masks)
+            if registers != list(rr.registers):
+                rr = await client.write_registers(start, registers)
+                if not _response_ok(rr, f"write {count} registers at {start}"):
+                    return False
+        except ModbusException as exc:
+            logging.warning(f"Received ModbusException({exc}) from library")
+            return False
+        self._store(start, registers)
+        return True
+
+    @staticmethod
+    def _cleared(start: int, registers, masks: dict) -> list:
+        return [
+            register & ~masks.get(start + k, 0) & 0xFFFF
+            for k, register in enumerate(registers)
+        ]
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Append-only pose log: raw ClientLocalizationPoseDatagram frames plus the time
+# they were received, in rotating preallocated files.
+#
+# File layout: a 64-byte header, then `capacity` records of 196 bytes, each the
+# 188-byte datagram as received followed by the receive time as little-endian
+# float64 epoch seconds. The header holds the number of valid records and is
+# updated after every record, so a crash loses at most the record being written.
+#
+# python pose_log.py logs/            # summary of every log in a directory
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+from locator_pose import DATAGRAM_FIELDS, FRAME_SIZE, unpacker
+
+try:
+    import numpy as np
+except ImportError:  # only the reader needs NumPy
+    np = None
+
+MAGIC = b"LOCPOSE1"
+VERSION = 1
+# magic, version, record size, capacity, count, created (epoch seconds)
+file_header = struct.Struct("<8sIIQQd")
+HEADER_SIZE = 64
+COUNT_OFFSET = 24  # of count in file_header
+_count = struct.Struct("<Q")
+_received = struct.Struct("<d")
+RECORD_SIZE = FRAME_SIZE + _received.size  # 196 bytes
+
+
+def record_dtype():
+    """NumPy structured dtype of one record, the datagram fields plus "received" """
+    codes = {"d": "<f8", "Q": "<u8", "i": "<i4"}
+    fields = [
+        (name, codes[code])
+        for name, code in zip(DATAGRAM_FIELDS, unpacker.format.lstrip("<"))
+    ]
+    return np.dtype(fields + [("received", "<f8")])
+
+
+class PoseRecorder:
+    """Append frames to memory-mapped log files in a directory.
+
+    A file is preallocated for capacity records when it is opened; when it is
+    full the next one is started, and only the newest `keep` files are kept.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        capacity: int = 360000,  # one hour at 100 Hz, 70 MB
+        keep: int = 24,
+        prefix: str = "poses",
+    ):
+        self.directory = directory
+        self.capacity = capacity
+        self.keep = keep
+        self.prefix = prefix
+        self.path = None
+        self.map = None
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self):
+        name = f"{self.prefix}-{datetime.now():%Y%m%d-%H%M%S-%f}.bin"
+        self.path = os.path.join(self.directory, name)
+        size = HEADER_SIZE + self.capacity * RECORD_SIZE
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        file_header.pack_into(
+            self.map, 0, MAGIC, VERSION, RECORD_SIZE, self.capacity, 0, time.time()
+        )
+        self.count = 0
+        self._prune()
+
+    def _prune(self):
+        for path in log_files(self.directory, self.prefix)[: -self.keep]:
+            os.remove(path)
+
+    def append(self, frame, received: float):
+        """Record one 188-byte frame and its receive time in epoch seconds"""
+        if self.map is None or self.count == self.capacity:
+            self.close()
+            self._open()
+        offset = HEADER_SIZE + self.count * RECORD_SIZE
+        self.map[offset : offset + FRAME_SIZE] = frame
+        _received.pack_into(self.map, offset + FRAME_SIZE, received)
+        self.count += 1
+        _count.pack_into(self.map, COUNT_OFFSET, self.count)
+
+    def flush(self):
+        if self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+
+
+def log_files(directory: str, prefix: str = "poses") -> list:
+    """Log files in a directory, oldest first"""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith(prefix + "-") and name.endswith(".bin")
+    )
+
+
+def open_log(path: str):
+    """Map a log file as a read-only NumPy structured array without copying.
+
+    Only the records written when the file is opened are included, so a file
+    that is still being recorded can be read as well.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, record_size, capacity, count, created = file_header.unpack_from(buf)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        buf.close()
+        raise ValueError(f"{path} is not a pose log")
+    return np.frombuffer(buf, dtype=record_dtype(), count=count, offset=HEADER_SIZE)
+
+
+def read_frames(path: str):
+    """Yield (frame, received) of a log file, frame as bytes; no NumPy needed"""
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with buf:
+        magic, version, record_size, capacity, count, created = file_header.unpack_from(
+            buf
+        )
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"{path} is not a pose log")
+        for offset in range(
+            HEADER_SIZE, HEADER_SIZE + count * RECORD_SIZE, RECORD_SIZE
+        ):
+            yield (
+                buf[offset : offset + FRAME_SIZE],
+                _received.unpack_from(buf, offset + FRAME_SIZE)[0],
+            )
+
+
+def summary(records) -> str:
+    if not len(records):
+        return "0 poses"
+    received = records["received"]
+    span = received[-1] - received[0]
+    rate = (len(records) - 1) / span if span > 0 else 0.0
+    start = datetime.fromtimestamp(received[0]).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{len(records)} poses from {start}, {span:.1f} s, {rate:.1f} Hz"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="shows a summary of recorded pose logs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="log files, or directories of log files"
+    )
+    args = parser.parse_args()
+
+    for path in args.paths:
+        files = log_files(path) if os.path.isdir(path) else [path]
+        for file in files:
+            tic = time.perf_counter()
+            records = open_log(file)
+            ms = (time.perf_counter() - tic) * 1000.0
+            print(f"{file}: {summary(records)}, mapped in {ms:.2f} ms")
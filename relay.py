@@ -9,11 +9,26 @@
 #
 
 import argparse
+import bisect
+import collections
+import errno
+import functools
+import ipaddress
+import itertools
+import json
+import math
+import os
+import random
+import selectors
 import socket
+import struct
 import time
 import sys
 import logging
 
+from locator_pose import DATAGRAM_FIELDS, PoseDeadband, PoseSnapshot, PoseStreamReader
+from locator_pose import unpacker
+from pose_log import PoseRecorder
 
 frq = 15
 src_host = "192.168.8.12"
@@ -21,10 +36,22 @@ src_port = 9011
 
 dst_host = ""
 dst_port = 9511
+max_buffer = 8  # frames queued per subscriber before frames are dropped
+dst_format = "raw"  # or e.g. ">d:x,y,yaw" for a compact record
+serve = []  # extra "port:policy[/format]" listeners
+udp = []  # "host:port[:policy[/format]]" UDP destinations
+ttl = 1  # hops of multicast datagrams
+mcast_if = ""  # local address of the interface multicast is sent from
+stats = 60.0  # seconds between statistics in the log, 0 for none
+stats_port = 0  # local port serving the statistics as JSON, 0 for none
+record = ""  # directory to record every frame from Locator to, see pose_log.py
+record_capacity = 360000  # frames per log file
+record_keep = 24  # log files kept
 
 
 # Create a custom logger
 logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 # Create handlers
 c_handler = logging.StreamHandler(sys.stdout)
@@ -43,79 +70,943 @@ logger.addHandler(c_handler)
 logger.addHandler(f_handler)
 
 
-# Arguments
-parser = argparse.ArgumentParser(
-    description="works as a relay to retransmit payloads at a specific frequency",
-    formatter_class=argparse.RawDescriptionHelpFormatter,
-)
-parser.add_argument("--frq", type=float, default=frq, help="frequency of package relay")
-parser.add_argument(
-    "--src_host", type=str, default=src_host, help="IP address of source host"
-)
-parser.add_argument(
-    "--src_port", type=int, default=src_port, help="port of source host"
-)
-parser.add_argument(
-    "--dst_host", type=str, default=dst_host, help="IP address of destination host"
-)
-parser.add_argument(
-    "--dst_port", type=int, default=dst_port, help="port of destination host"
-)
-args = parser.parse_args()
-if args.frq:
-    frq = args.frq
-if args.src_host:
-    src_host = args.src_host
-if args.src_port:
-    r = range(1, 65535)
-    if args.src_port not in r:
-        raise argparse.ArgumentTypeError("Port number has to be between 1 and 65535")
-    src_port = args.src_port
-if args.dst_host:
-    dst_host = args.dst_host
-if args.dst_port:
-    r = range(1, 65535)
-    if args.dst_port not in r:
-        raise argparse.ArgumentTypeError("Port number has to be between 1 and 65535")
-    dst_port = args.dst_port
-
-logger.info(f"Frequency: {frq}")
-logger.info(f"Destination host: {dst_host}")
-logger.info(f"Destination port: {dst_port}")
-
-
-# Socket instances
-c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-# Avoid bind() exception: OSError: [Errno 48] Address already in use
-s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-s.bind((dst_host, dst_port))
-s.listen(50)
-logger.info(f"Listening on port {dst_port}")
-tic = time.perf_counter()
-t_delta = 1.0 / frq
-
-
-while True:
+class Frame:
+    """One complete datagram from Locator; it is only unpacked on demand"""
+
+    __slots__ = ("seq", "data", "received", "_unpacked", "_pose")
+
+    def __init__(self, seq: int, data: bytes, received: float):
+        self.seq = seq
+        self.data = data
+        self.received = received  # epoch seconds
+        self._unpacked = None
+        self._pose = None
+
+    @property
+    def timestamp(self) -> float:
+        """Epoch seconds when Locator sent the datagram"""
+        return _timestamp.unpack_from(self.data, 8)[0]
+
+    @property
+    def unpacked(self) -> tuple:
+        if self._unpacked is None:
+            self._unpacked = unpacker.unpack(self.data)
+        return self._unpacked
+
+    @property
+    def pose(self) -> PoseSnapshot:
+        if self._pose is None:
+            self._pose = PoseSnapshot.from_datagram(self.seq, self.unpacked)
+        return self._pose
+
+
+_FIELD_CODES = unpacker.format.lstrip("<>=!@")
+_timestamp = struct.Struct("<d")  # second field of the datagram
+
+
+class LatencyHistogram:
+    """Latencies in milliseconds, in fixed buckets, since the last reset.
+
+    Percentiles are the upper bound of the bucket they fall in. Latencies
+    against Locator timestamps include the clock offset between the hosts.
+    """
+
+    bounds = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, seconds: float):
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+
+    def percentile(self, q: float) -> float:
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self, reset: bool = True) -> dict:
+        """Summary of the recorded latencies, then start a new window if reset"""
+        if not self.count:
+            return {"count": 0}
+        summary = {
+            "count": self.count,
+            "min_ms": round(self.min, 2),
+            "mean_ms": round(self.total / self.count, 2),
+            "p50_ms": round(self.percentile(0.5), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(self.max, 2),
+            "buckets": {
+                f"<={bound}": count
+                for bound, count in zip(self.bounds + ("inf",), self.counts)
+                if count
+            },
+        }
+        if reset:
+            self.reset()
+        return summary
+
+
+def _latency(summary: dict) -> str:
+    if not summary["count"]:
+        return "-"
+    return f"p50 {summary['p50_ms']} p95 {summary['p95_ms']} max {summary['max_ms']} ms"
+
+
+class RawFormat:
+    """Send the datagram as received from Locator"""
+
+    def encode(self, frame: Frame) -> bytes:
+        return frame.data
+
+    def __repr__(self):
+        return "raw"
+
+
+class Projection(RawFormat):
+    """Send selected fields of the datagram as one packed binary record.
+
+    Floats are sent as float64 ("d") or float32 ("f"), integer fields keep
+    their type. A PLC that only needs x, y, yaw reads 24 instead of 188 bytes
+    per frame with ">d:x,y,yaw", the layout seed_s7.py writes.
+    """
+
+    def __init__(self, fields, byteorder: str = ">", float_type: str = "d"):
+        self.fields = tuple(fields)
+        self.indices = [DATAGRAM_FIELDS.index(field) for field in self.fields]
+        codes = [_FIELD_CODES[i] for i in self.indices]
+        self.packer = struct.Struct(
+            byteorder + "".join(float_type if c == "d" else c for c in codes)
+        )
+        self._seq = None
+        self._data = None
+
+    def encode(self, frame: Frame) -> bytes:
+        # subscribers of one port share the projection, pack every frame once
+        if frame.seq != self._seq:
+            unpacked = frame.unpacked
+            self._data = self.packer.pack(*[unpacked[i] for i in self.indices])
+            self._seq = frame.seq
+        return self._data
+
+    def __repr__(self):
+        return f"{self.packer.format} {','.join(self.fields)}"
+
+
+def parse_format(spec: str) -> RawFormat:
+    """Output format from "raw" or "ORDER TYPE:FIELD,..." such as ">d:x,y,yaw" """
+    if spec == "raw":
+        return RawFormat()
+    layout, _, fields = spec.partition(":")
+    fields = [field for field in fields.split(",") if field]
+    if (
+        len(layout) != 2
+        or layout[0] not in "<>"
+        or layout[1] not in "fd"
+        or not fields
+        or any(field not in DATAGRAM_FIELDS for field in fields)
+    ):
+        raise ValueError(
+            f"invalid output format {spec!r}, fields are {', '.join(DATAGRAM_FIELDS)}"
+        )
+    return Projection(fields, layout[0], layout[1])
+
+
+class Passthrough:
+    """Forward every frame"""
+
+    latest_only = False
+    next_due = math.inf  # monotonic time of the next timer tick
+
+    def offer(self, frame: Frame) -> bool:
+        """Whether frame is to be queued for the subscriber right away"""
+        return True
+
+    def tick(self, now: float) -> Frame:
+        return None
+
+    def __repr__(self):
+        return "passthrough"
+
+
+class LatestRate(Passthrough):
+    """Send the newest frame at a fixed rate.
+
+    Ticks are scheduled on a fixed grid, so the rate does not drift with the
+    arrival of frames. A frame still waiting in the send buffer at the next
+    tick is replaced by the newer one.
+    """
+
+    latest_only = True
+
+    def __init__(self, frq: float):
+        self.period = 1.0 / frq
+        self.next_due = time.monotonic() + self.period
+        self.latest = None
+
+    def offer(self, frame: Frame) -> bool:
+        self.latest = frame
+        return False
+
+    def tick(self, now: float) -> Frame:
+        self.next_due += self.period
+        if self.next_due <= now:  # fell behind, e.g. after a long select()
+            self.next_due = now + self.period
+        frame, self.latest = self.latest, None
+        return frame
+
+    def __repr__(self):
+        return f"rate:{1.0 / self.period:g}"
+
+
+class EveryNth(Passthrough):
+    """Forward every n-th frame"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.count = 0
+
+    def offer(self, frame: Frame) -> bool:
+        self.count += 1
+        if self.count < self.n:
+            return False
+        self.count = 0
+        return True
+
+    def __repr__(self):
+        return f"every:{self.n}"
+
+
+class Deadband(Passthrough):
+    """Forward a frame when the pose moved beyond x/y or yaw thresholds.
+
+    With max_interval a frame is also forwarded as a heartbeat when nothing
+    was sent for that long.
+    """
+
+    def __init__(self, xy: float, yaw: float, max_interval: float = math.inf):
+        self.band = PoseDeadband(xy, yaw, 0.0, max_interval)
+
+    def offer(self, frame: Frame) -> bool:
+        now = time.monotonic()
+        pose = frame.pose
+        if not self.band.due(pose, now):
+            return False
+        self.band.mark_written(pose, now)
+        return True
+
+    def __repr__(self):
+        band = self.band
+        return f"deadband:{band.xy:g}:{band.yaw:g}:{band.max_interval:g}"
+
+
+def parse_policy(spec: str) -> Passthrough:
+    """Policy from "passthrough", "rate:HZ", "every:N" or "deadband:XY:YAW[:MAX_INTERVAL]" """
+    name, *params = spec.split(":")
     try:
-        c.connect((src_host, src_port))
+        if name == "passthrough" and not params:
+            return Passthrough()
+        if name == "rate" and len(params) == 1:
+            return LatestRate(float(params[0]))
+        if name == "every" and len(params) == 1 and int(params[0]) > 0:
+            return EveryNth(int(params[0]))
+        if name == "deadband" and len(params) in (2, 3):
+            return Deadband(*map(float, params))
+    except ValueError:
+        pass
+    raise ValueError(f"invalid delivery policy {spec!r}")
+
+
+class Subscriber:
+    """One downstream connection with its own bounded send queue.
+
+    Only whole frames are queued. When the queue is full the subscriber is too
+    slow and its oldest queued frame is dropped; the upstream and the other
+    subscribers are not held back.
+    """
+
+    def __init__(
+        self, sock, addr, policy: Passthrough, output: RawFormat, max_frames: int
+    ):
+        self.sock = sock
+        self.addr = addr
+        self.policy = policy
+        self.output = output
+        self.queue = collections.deque()
+        self.max_frames = 1 if policy.latest_only else max_frames
+        self.out = None  # rest of the frame being sent
+        self.out_received = 0.0
+        self.frames = 0
+        self.dropped = 0
+        self.offered = 0  # frames from Locator, minus queued ones = decimated
+        self.queued = 0
+        self.latency = LatencyHistogram()  # receipt from Locator to sent
+
+    def push(self, data: bytes, received: float):
+        if len(self.queue) >= self.max_frames:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((data, received))
+        self.queued += 1
+
+    def pending(self) -> bool:
+        return self.out is not None or bool(self.queue)
+
+    def send(self):
+        """Send queued frames until the socket would block, OSError if it is gone"""
+        while True:
+            if self.out is None:
+                if not self.queue:
+                    return
+                data, self.out_received = self.queue.popleft()
+                self.out = memoryview(data)
+            try:
+                nbytes = self.sock.send(self.out)
+            except BlockingIOError:
+                return
+            if nbytes < len(self.out):
+                self.out = self.out[nbytes:]
+                return
+            self.out = None
+            self.frames += 1
+            self.latency.record(time.time() - self.out_received)
+
+
+class UdpDestination:
+    """Publish frames as UDP datagrams to a unicast or multicast address.
+
+    Every datagram starts with a big-endian uint32 sequence number, counting
+    all frames meant for this destination, so a listener can detect loss.
+    A datagram that cannot be sent right away is dropped.
+    """
+
+    sequence = struct.Struct(">I")
+
+    def __init__(self, sock, address, policy: Passthrough, output: RawFormat):
+        self.sock = sock
+        self.address = address
+        self.policy = policy
+        self.output = output
+        self.seq = 0
+        self.frames = 0
+        self.dropped = 0
+        self.offered = 0
+        self.queued = 0
+        self.latency = LatencyHistogram()
+
+    def send(self, frame: Frame):
+        datagram = self.sequence.pack(self.seq) + self.output.encode(frame)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        try:
+            self.sock.sendto(datagram, self.address)
+        except OSError:  # full socket buffer, or ICMP unreachable from a peer
+            self.dropped += 1
+            return
+        self.frames += 1
+        self.latency.record(time.time() - frame.received)
+
+
+def tune_socket(sock):
+    """TCP_NODELAY, and keepalive probes to detect a dead peer within seconds"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Linux: first probe after 5 s idle, then every second, give up after 3
+    for option, value in (
+        ("TCP_KEEPIDLE", 5),
+        ("TCP_KEEPINTVL", 1),
+        ("TCP_KEEPCNT", 3),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+DISCONNECTED, CONNECTING, CONNECTED = "disconnected", "connecting", "connected"
+
+
+class Relay:
+    """Serve one upstream Locator pose stream to any number of subscribers.
+
+    Everything runs in one thread around a selector and no socket ever blocks
+    the loop. Every listening port has a delivery policy, and each subscriber
+    accepted on it gets its own instance. UDP destinations have their policy
+    as well and share one socket.
+
+    When the source host closes the stream or cannot be reached, the relay
+    connects again with a fresh socket after an exponential backoff with
+    jitter; subscribers stay connected meanwhile.
+    """
+
+    connect_timeout = 5.0
+    stats_timeout = 5.0  # seconds a stats client may take to send its request
+    min_backoff = 0.5
+    max_backoff = 30.0
+
+    def __init__(
+        self,
+        src,
+        listeners,
+        max_frames: int,
+        udp=(),
+        ttl: int = 1,
+        interface=None,
+        stats_interval: float = 60.0,
+        stats_port: int = 0,
+        recorder=None,
+    ):
+        self.src = src
+        self.max_frames = max_frames
+        self.recorder = recorder  # PoseRecorder of every frame from Locator
+        self.selector = selectors.DefaultSelector()
+        self.reader = PoseStreamReader()
+        self.upstream = None
+        self.state = DISCONNECTED
+        self.deadline = 0.0  # of the connect attempt, or when to start the next
+        self.backoff = self.min_backoff
+        self.seq = 0
+        self.arrival = LatencyHistogram()  # Locator timestamp to receipt
+        self.jitter = LatencyHistogram()  # inter-arrival against Locator's interval
+        self._last = None  # (timestamp, received) of the previous frame
+        self.stats_interval = stats_interval
+        self.next_report = time.monotonic() + (stats_interval or math.inf)
+        self.subscribers = {}  # socket: Subscriber
+        self.listeners = []
+        for address, policy, output in listeners:
+            parse_policy(policy)  # fail early on a typo
+            output = parse_format(output)
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Avoid bind() exception: OSError: [Errno 48] Address already in use
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(address)
+            listener.listen(50)
+            listener.setblocking(False)
+            self.selector.register(
+                listener,
+                selectors.EVENT_READ,
+                functools.partial(self._accept, policy, output),
+            )
+            self.listeners.append(listener)
+            logger.info(f"Listening on port {address[1]}, {policy}, {output}")
+        self.stats_listener = None
+        self.stats_clients = {}  # socket: deadline of the request
+        if stats_port:
+            self.stats_listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.stats_listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.stats_listener.bind(("127.0.0.1", stats_port))
+            self.stats_listener.listen(5)
+            self.stats_listener.setblocking(False)
+            self.selector.register(
+                self.stats_listener, selectors.EVENT_READ, self._serve_stats
+            )
+            logger.info(f"Statistics on http://127.0.0.1:{stats_port}/")
+        self.udp = None
+        self.destinations = []
+        if udp:
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            if interface:  # local address of the NIC for multicast
+                self.udp.setsockopt(
+                    socket.IPPROTO_IP,
+                    socket.IP_MULTICAST_IF,
+                    socket.inet_aton(interface),
+                )
+            self.udp.setblocking(False)
+        for address, policy, output in udp:
+            self.destinations.append(
+                UdpDestination(
+                    self.udp, address, parse_policy(policy), parse_format(output)
+                )
+            )
+            multicast = ipaddress.ip_address(address[0]).is_multicast
+            logger.info(
+                f"Publishing to udp {'multicast ' if multicast else ''}{address[0]}:{address[1]}, {policy}, {parse_format(output)}"
+            )
+
+    # upstream connection: DISCONNECTED -> CONNECTING -> CONNECTED -> DISCONNECTED
+
+    def _connect_upstream(self):
+        """Start a non-blocking connect on a fresh socket"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        err = sock.connect_ex(self.src)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            self._upstream_lost(f"connect failed, {os.strerror(err)}")
+            return
+        self.upstream = sock
+        self.state = CONNECTING
+        self.deadline = time.monotonic() + self.connect_timeout
+        self.selector.register(sock, selectors.EVENT_WRITE, self._upstream_connected)
+
+    def _upstream_connected(self, sock, mask: int):
+        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self._upstream_lost(f"connect failed, {os.strerror(err)}")
+            return
+        tune_socket(sock)
+        self.reader.reset()
+        self._last = None
+        self.state = CONNECTED
+        self.selector.modify(sock, selectors.EVENT_READ, self._read_upstream)
         logger.info("Source host has been connected.")
-        conn, addr = s.accept()
-        logger.info(f"Connected by {addr}")
+
+    def _upstream_lost(self, reason: str):
+        """Close the upstream socket and schedule the next attempt"""
+        self._close_upstream()
+        # full jitter keeps relays of a fleet from reconnecting in lockstep
+        delay = random.uniform(0.5, 1.0) * self.backoff
+        self.deadline = time.monotonic() + delay
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        logger.warning(f"Source host {reason}, reconnecting in {delay:.1f} s")
+
+    def _close_upstream(self):
+        if self.upstream is not None:
+            self.selector.unregister(self.upstream)
+            self.upstream.close()
+            self.upstream = None
+        self.state = DISCONNECTED
+
+    def _accept(self, policy: str, output: RawFormat, listener, mask: int):
+        try:
+            sock, addr = listener.accept()
+        except BlockingIOError:
+            return
+        except OSError as e:  # e.g. out of file descriptors, try again later
+            logger.warning(f"accept() failed, {e!r}")
+            return
+        sock.setblocking(False)
+        tune_socket(sock)
+        subscriber = Subscriber(
+            sock, addr, parse_policy(policy), output, self.max_frames
+        )
+        self.subscribers[sock] = subscriber
+        self.selector.register(sock, selectors.EVENT_READ, self._serve)
+        logger.info(
+            f"Connected by {addr}, {subscriber.policy}, {len(self.subscribers)} subscribers"
+        )
+
+    def _drop(self, subscriber: Subscriber, reason):
+        self.selector.unregister(subscriber.sock)
+        subscriber.sock.close()
+        del self.subscribers[subscriber.sock]
+        logger.info(
+            f"Disconnected {subscriber.addr}, {reason}, {subscriber.frames} frames sent, {subscriber.dropped} dropped"
+        )
+
+    def _serve(self, sock, mask: int):
+        subscriber = self.subscribers[sock]
+        try:
+            if mask & selectors.EVENT_READ:
+                # subscribers do not send anything, this is the end of the stream
+                if not sock.recv(1024):
+                    self._drop(subscriber, "closed by peer")
+                    return
+            if mask & selectors.EVENT_WRITE:
+                subscriber.send()
+                if not subscriber.pending():
+                    self.selector.modify(sock, selectors.EVENT_READ, self._serve)
+        except OSError as e:
+            self._drop(subscriber, repr(e))
+
+    def _read_upstream(self, sock, mask: int):
+        try:
+            nbytes = self.reader.recv_into(sock)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._upstream_lost(f"connection lost, {e!r}")
+            return
+        if not nbytes:  # EOF
+            self._upstream_lost("closed the stream")
+            return
+        received = time.time()
+        for offset in self.reader.pending_frames():
+            self.seq += 1
+            frame = Frame(self.seq, bytes(self.reader.frame(offset)), received)
+            timestamp = frame.timestamp
+            self.arrival.record(received - timestamp)
+            if self._last is not None:
+                last_timestamp, last_received = self._last
+                self.jitter.record(
+                    abs((received - last_received) - (timestamp - last_timestamp))
+                )
+            self._last = (timestamp, received)
+            if self.recorder is not None:
+                self.recorder.append(frame.data, received)
+            self.publish(frame)
+        if self._last is not None:  # this connection delivers frames
+            self.backoff = self.min_backoff
+
+    def _queue(self, subscriber: Subscriber, frame: Frame):
+        idle = not subscriber.pending()
+        subscriber.push(subscriber.output.encode(frame), frame.received)
+        if idle:
+            self.selector.modify(
+                subscriber.sock,
+                selectors.EVENT_READ | selectors.EVENT_WRITE,
+                self._serve,
+            )
+
+    def _targets(self):
+        return itertools.chain(self.subscribers.values(), self.destinations)
+
+    def _deliver(self, target, frame: Frame):
+        if isinstance(target, UdpDestination):
+            target.queued += 1
+            target.send(frame)
+        else:
+            self._queue(target, frame)
+
+    def publish(self, frame: Frame):
+        for target in self._targets():
+            target.offered += 1
+            if target.policy.offer(frame):
+                self._deliver(target, frame)
+
+    def _tick(self) -> float:
+        """Serve the rate timers that are due, return seconds to the next one"""
+        now = time.monotonic()
+        timeout = 1.0
+        for target in self._targets():
+            policy = target.policy
+            if policy.next_due <= now:
+                frame = policy.tick(now)
+                if frame is not None:
+                    self._deliver(target, frame)
+            timeout = min(timeout, policy.next_due - now)
+        if now >= self.next_report:
+            self.report()
+            self.next_report = now + self.stats_interval
+        timeout = min(timeout, self.next_report - now)
+        for sock, deadline in list(self.stats_clients.items()):
+            if now >= deadline:
+                self._close_stats_client(sock)
+            else:
+                timeout = min(timeout, deadline - now)
+        return max(timeout, 0.0)
+
+    def stats(self, reset: bool = True) -> dict:
+        """Counters and latency histograms; the histograms start a new window if reset"""
+        targets = []
+        for target in self._targets():
+            if isinstance(target, UdpDestination):
+                name = f"udp {target.address[0]}:{target.address[1]}"
+            else:
+                name = f"tcp {target.addr[0]}:{target.addr[1]}"
+            targets.append(
+                {
+                    "name": name,
+                    "policy": repr(target.policy),
+                    "format": repr(target.output),
+                    "offered": target.offered,
+                    "sent": target.frames,
+                    "decimated": target.offered - target.queued,
+                    "dropped": target.dropped,
+                    "latency": target.latency.snapshot(reset),
+                }
+            )
+        return {
+            "time": time.time(),
+            "upstream": dict(
+                self.reader.stats(reset),
+                connected=self.state == CONNECTED,
+                latency=self.arrival.snapshot(reset),
+                jitter=self.jitter.snapshot(reset),
+            ),
+            "subscribers": targets,
+        }
+
+    def report(self):
+        """Log the statistics of the last interval, one line per subscriber"""
+        stats = self.stats()
+        upstream = stats["upstream"]
+        lines = [
+            f"upstream {upstream['fps']} fps, {upstream['resyncs']} resyncs, Locator to relay {_latency(upstream['latency'])}, jitter {_latency(upstream['jitter'])}"
+        ]
+        for target in stats["subscribers"]:
+            lines.append(
+                f"{target['name']} {target['policy']}: {target['sent']} sent, {target['decimated']} decimated, {target['dropped']} dropped, relay to subscriber {_latency(target['latency'])}"
+            )
+        logger.info("statistics\n" + "\n".join(lines))
+
+    def _serve_stats(self, listener, mask: int):
+        """Accept a stats client; it is answered once its request arrives"""
+        try:
+            sock, _ = listener.accept()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.warning(f"accept() failed, {e!r}")
+            return
+        sock.setblocking(False)
+        self.stats_clients[sock] = time.monotonic() + self.stats_timeout
+        self.selector.register(sock, selectors.EVENT_READ, self._answer_stats)
+
+    def _answer_stats(self, sock, mask: int):
+        """Answer any request with the statistics since the last report as JSON"""
+        try:
+            if not sock.recv(1024):  # the request is not looked at
+                self._close_stats_client(sock)
+                return
+        except BlockingIOError:
+            return
+        except OSError:
+            self._close_stats_client(sock)
+            return
+        body = json.dumps(self.stats(reset=False)).encode()
+        response = (
+            b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        self._send_stats(memoryview(response), sock, selectors.EVENT_WRITE)
+
+    def _send_stats(self, pending: memoryview, sock, mask: int):
+        """Send what the socket takes, wait until it is writable for the rest"""
+        try:
+            sent = sock.send(pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._close_stats_client(sock)
+            return
+        if sent == len(pending):
+            self._close_stats_client(sock)
+            return
+        self.selector.modify(
+            sock,
+            selectors.EVENT_WRITE,
+            functools.partial(self._send_stats, pending[sent:]),
+        )
+
+    def _close_stats_client(self, sock):
+        self.selector.unregister(sock)
+        del self.stats_clients[sock]
+        sock.close()
+
+    def run(self):
         while True:
-            data = c.recv(1024)  # length of pose payload is 188
-            if not data:
-                continue
-            toc = time.perf_counter()
-            if (toc - tic) >= t_delta:
-                conn.sendall(data)
-                tic = toc
+            self.poll()
+
+    def poll(self):
+        """One round of the event loop"""
+        now = time.monotonic()
+        if self.state == DISCONNECTED and now >= self.deadline:
+            self._connect_upstream()
+        elif self.state == CONNECTING and now >= self.deadline:
+            self._upstream_lost("did not answer, connect timed out")
+        timeout = self._tick()
+        if self.state != CONNECTED:
+            timeout = min(timeout, max(self.deadline - time.monotonic(), 0.0))
+        for key, mask in self.selector.select(timeout):
+            key.data(key.fileobj, mask)
+
+    def close(self):
+        self._close_upstream()
+        for subscriber in list(self.subscribers.values()):
+            self._drop(subscriber, "relay stopped")
+        for listener in self.listeners:
+            listener.close()
+        if self.udp is not None:
+            self.udp.close()
+        for sock in list(self.stats_clients):
+            self._close_stats_client(sock)
+        if self.stats_listener is not None:
+            self.stats_listener.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.selector.close()
+
+
+if __name__ == "__main__":
+    # Arguments
+    parser = argparse.ArgumentParser(
+        description="works as a relay to retransmit payloads at a specific frequency",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--frq", type=float, default=frq, help="frequency of package relay"
+    )
+    parser.add_argument(
+        "--src_host", type=str, default=src_host, help="IP address of source host"
+    )
+    parser.add_argument(
+        "--src_port", type=int, default=src_port, help="port of source host"
+    )
+    parser.add_argument(
+        "--dst_host", type=str, default=dst_host, help="IP address of destination host"
+    )
+    parser.add_argument(
+        "--dst_port", type=int, default=dst_port, help="port of destination host"
+    )
+    parser.add_argument(
+        "--dst_format",
+        type=str,
+        default=dst_format,
+        help="""output format of destination port, raw (188-byte datagram) or
+ORDER TYPE:FIELD,... with ORDER < or >, TYPE d (float64) or f (float32),
+e.g. >d:x,y,yaw,localization_state""",
+    )
+    parser.add_argument(
+        "--max_buffer",
+        type=int,
+        default=max_buffer,
+        help="frames queued per subscriber, the oldest are dropped for a slower subscriber",
+    )
+    parser.add_argument(
+        "--serve",
+        type=str,
+        action="append",
+        default=serve,
+        help="""additional port with a delivery policy, PORT:POLICY[/FORMAT], repeatable.
+POLICY is passthrough, rate:HZ (newest frame at a fixed rate), every:N
+(every n-th frame) or deadband:XY:YAW[:MAX_INTERVAL] (frames that moved
+more than XY meter or YAW radian). FORMAT is as --dst_format, raw by default.
+--dst_port is served with rate:FRQ""",
+    )
+    parser.add_argument(
+        "--udp",
+        type=str,
+        action="append",
+        default=udp,
+        help="""UDP unicast or multicast destination, HOST:PORT[:POLICY[/FORMAT]],
+repeatable. POLICY and FORMAT are as for --serve, passthrough and raw by
+default. Every datagram is prefixed by a big-endian uint32 sequence number""",
+    )
+    parser.add_argument(
+        "--ttl", type=int, default=ttl, help="time to live of multicast datagrams"
+    )
+    parser.add_argument(
+        "--mcast_if",
+        type=str,
+        default=mcast_if,
+        help="local IP address of the interface to send multicast datagrams from",
+    )
+    parser.add_argument(
+        "--stats",
+        type=float,
+        default=stats,
+        help="interval in seconds of latency and frame statistics in the log, 0 for none",
+    )
+    parser.add_argument(
+        "--stats_port",
+        type=int,
+        default=stats_port,
+        help="port on 127.0.0.1 serving the statistics since the last --stats report (or the start) as JSON, 0 for none",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=record,
+        help="directory to record every frame from Locator to, read them with pose_log.py",
+    )
+    parser.add_argument(
+        "--record_capacity",
+        type=int,
+        default=record_capacity,
+        help="frames per preallocated log file, 196 bytes each",
+    )
+    parser.add_argument(
+        "--record_keep",
+        type=int,
+        default=record_keep,
+        help="number of log files kept, older ones are deleted",
+    )
+    args = parser.parse_args()
+    if args.frq:
+        frq = args.frq
+    if args.src_host:
+        src_host = args.src_host
+    if args.src_port:
+        r = range(1, 65535)
+        if args.src_port not in r:
+            raise argparse.ArgumentTypeError(
+                "Port number has to be between 1 and 65535"
+            )
+        src_port = args.src_port
+    if args.dst_host:
+        dst_host = args.dst_host
+    if args.dst_port:
+        r = range(1, 65535)
+        if args.dst_port not in r:
+            raise argparse.ArgumentTypeError(
+                "Port number has to be between 1 and 65535"
+            )
+        dst_port = args.dst_port
+    if args.max_buffer:
+        max_buffer = args.max_buffer
+    if args.dst_format:
+        dst_format = args.dst_format
+    listeners = [((dst_host, dst_port), f"rate:{frq}", dst_format)]
+    for spec in args.serve:
+        port, _, policy = spec.partition(":")
+        policy, _, output = policy.partition("/")
+        try:
+            parse_policy(policy)
+            parse_format(output or "raw")
+            listeners.append(((dst_host, int(port)), policy, output or "raw"))
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"--serve {spec}: {e}")
+
+    logger.info(f"Frequency: {frq}")
+    logger.info(f"Destination host: {dst_host}")
+    logger.info(f"Destination port: {dst_port}")
+
+    destinations = []
+    for spec in args.udp:
+        host, _, rest = spec.partition(":")
+        port, _, policy = rest.partition(":")
+        policy, _, output = policy.partition("/")
+        try:
+            ipaddress.ip_address(host)
+            parse_policy(policy or "passthrough")
+            parse_format(output or "raw")
+            destinations.append(
+                ((host, int(port)), policy or "passthrough", output or "raw")
+            )
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"--udp {spec}: {e}")
+    if args.ttl:
+        ttl = args.ttl
+    if args.mcast_if:
+        mcast_if = args.mcast_if
+    stats = args.stats
+    stats_port = args.stats_port
+    recorder = None
+    if args.record:
+        recorder = PoseRecorder(args.record, args.record_capacity, args.record_keep)
+        logger.info(f"Recording to {args.record}")
+
+    relay = Relay(
+        (src_host, src_port),
+        listeners,
+        max_buffer,
+        destinations,
+        ttl,
+        mcast_if,
+        stats,
+        stats_port,
+        recorder,
+    )
+    try:
+        relay.run()
     except KeyboardInterrupt:
         # press ctrl+c to stop the program
-        c.close()
-        s.close()
-        # logger.info("Caught keyboard interrupt, exiting")
+        relay.close()
         logger.exception(KeyboardInterrupt)
         sys.exit("Caught keyboard interrupt, exiting")
-    except Exception as e:
-        logger.exception(e)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Fake ROKIT Locator binary pose port: serves recorded pose logs (pose_log.py) or
+# a synthetic trajectory as ClientLocalizationPoseDatagram frames, to test the
+# bridges and relay.py without a vehicle.
+#
+# python replay.py --port 9011                       # synthetic, 100 Hz
+# python replay.py logs/ --rate 10 --fragment 4      # recorded, 10x, split writes
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import struct
+import time
+
+import pose_log
+from locator_pose import unpacker
+
+_timestamp = struct.Struct("<d")  # second field of the datagram
+
+
+def synthetic_frames(
+    frq: float = 100.0, radius: float = 5.0, speed: float = 0.5, epoch: float = None
+):
+    """Endless frames of a localized vehicle driving a circle, frq per second.
+
+    Timestamps count from epoch, the time of the first frame if None, so they
+    are plausible even when they are not restamped.
+    """
+    if epoch is None:
+        epoch = time.time()
+    i = 0
+    while True:
+        t = i / frq
+        angle = speed * t / radius
+        yield unpacker.pack(
+            0.0,  # age
+            epoch + t,  # timestamp; restamped when sent unless --keep_timestamps
+            i,  # uniqueId
+            2,  # localization_state, LOCALIZED
+            0,
+            0,
+            radius * math.cos(angle),
+            radius * math.sin(angle),
+            math.remainder(angle + math.pi / 2, math.tau),
+            *[0.0] * 11,
+            0,
+            0.0,
+            0.0,
+            0.0,
+        )
+        i += 1
+
+
+def log_frames(paths: list, loop: bool = False):
+    """Frames of pose log files, or of every log in a directory, in order"""
+    files = []
+    for path in paths:
+        files += pose_log.log_files(path) if os.path.isdir(path) else [path]
+    while True:
+        for file in files:
+            for frame, _ in pose_log.read_frames(file):
+                yield frame
+        if not loop:
+            return
+
+
+class ReplayServer:
+    """Play frames to every client that connects, each from the beginning.
+
+    rate scales the intervals between the datagram timestamps: 1.0 is real
+    time, 10.0 ten times as fast, 0 as fast as the client reads. Faults can be
+    injected to exercise the framing and reconnect code of the clients:
+
+    fragment  split every write into up to this many pieces
+    coalesce  merge up to this many frames into one write
+    disconnect  drop the connection after a random number of frames up to this
+
+    Frames are paced by the step from the previous timestamp. A step back,
+    where a log starts again with --loop, counts as the previous interval,
+    and a step forward is capped at max_gap seconds, e.g. while the recorder
+    was down between two files.
+    """
+
+    def __init__(
+        self,
+        source,
+        rate: float = 1.0,
+        restamp: bool = True,
+        fragment: int = 1,
+        coalesce: int = 1,
+        disconnect: int = 0,
+        max_gap: float = 1.0,
+        seed=None,
+    ):
+        self.source = source  # callable returning a new frame iterator
+        self.rate = rate
+        self.restamp = restamp
+        self.fragment = fragment
+        self.coalesce = coalesce
+        self.disconnect = disconnect
+        self.max_gap = max_gap
+        self.random = random.Random(seed)
+        self.clients = 0
+
+    async def _write(self, writer, data: bytearray):
+        if self.fragment > 1 and len(data) > 1:
+            pieces = self.random.randint(1, min(self.fragment, len(data)))
+            cuts = sorted(self.random.sample(range(1, len(data)), pieces - 1))
+            for a, b in zip([0] + cuts, cuts + [len(data)]):
+                writer.write(data[a:b])
+                await writer.drain()
+                if b < len(data):
+                    await asyncio.sleep(0.001)  # let the piece leave on its own
+            return
+        writer.write(data)
+        await writer.drain()
+
+    async def play(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        sock = writer.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients += 1
+        logging.info(f"{peer} connected, {self.clients} clients")
+        loop = asyncio.get_running_loop()
+        limit = self.random.randint(1, self.disconnect) if self.disconnect else 0
+        sent = 0
+        started = due = loop.time()
+        pending = bytearray()
+        batch = self.random.randint(1, self.coalesce)
+        previous = None
+        interval = 0.0  # last step between timestamps, seconds
+        try:
+            for frame in self.source():
+                timestamp = _timestamp.unpack_from(frame, 8)[0]
+                if previous is not None:
+                    step = timestamp - previous
+                    if 0.0 <= step <= self.max_gap:
+                        interval = step
+                    elif step > self.max_gap:
+                        step = self.max_gap
+                    else:  # the log starts again
+                        step = interval
+                    due += step / self.rate if self.rate > 0 else 0.0
+                previous = timestamp
+                if self.rate > 0:
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                offset = len(pending)
+                pending += frame
+                if self.restamp:
+                    _timestamp.pack_into(pending, offset + 8, time.time())
+                sent += 1
+                if sent % batch == 0 or sent == limit:
+                    await self._write(writer, pending)
+                    pending = bytearray()
+                    batch = self.random.randint(1, self.coalesce)
+                if sent == limit:
+                    logging.info(f"{peer} disconnected after {sent} frames")
+                    return
+            if pending:
+                await self._write(writer, pending)
+            logging.info(f"{peer} end of log after {sent} frames")
+        except (ConnectionError, OSError) as e:
+            logging.info(f"{peer} {e!r} after {sent} frames")
+        finally:
+            self.clients -= 1
+            elapsed = loop.time() - started
+            if elapsed > 0:
+                logging.info(f"{peer} {sent / elapsed:.1f} frames/s")
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.play, host, port)
+        logging.info(f"Serving poses on port {port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="serves recorded or synthetic poses as a fake ROKIT Locator binary port",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "logs",
+        nargs="*",
+        help="pose log files or directories recorded with relay.py --record, synthetic poses if none",
+    )
+    parser.add_argument("--host", type=str, default="", help="address to listen on")
+    parser.add_argument("--port", type=int, default=9011, help="port to listen on")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="playback speed, 1: real time, 10: ten times as fast, 0: as fast as possible",
+    )
+    parser.add_argument(
+        "--frq", type=float, default=100.0, help="frequency of synthetic poses"
+    )
+    parser.add_argument(
+        "--loop", action="store_true", help="start the logs again at their end"
+    )
+    parser.add_argument(
+        "--keep_timestamps",
+        action="store_true",
+        help="send the recorded timestamps instead of the time of sending",
+    )
+    parser.add_argument(
+        "--fragment",
+        type=int,
+        default=1,
+        help="split every write into up to this many pieces",
+    )
+    parser.add_argument(
+        "--coalesce",
+        type=int,
+        default=1,
+        help="merge up to this many frames into one write",
+    )
+    parser.add_argument(
+        "--disconnect",
+        type=int,
+        default=0,
+        help="drop a client after a random number of frames up to this, 0: never",
+    )
+    parser.add_argument(
+        "--max_gap",
+        type=float,
+        default=1.0,
+        help="longest pause in seconds between two recorded frames, e.g. between log files",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed of the fault injection"
+    )
+    args = parser.parse_args()
+
+    format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
+    logging.basicConfig(format=format, level=logging.INFO, datefmt="%Y-%m-%d %H:%M:%S")
+
+    if args.logs:
+        source = lambda: log_frames(args.logs, args.loop)  # noqa: E731
+    else:
+        source = lambda: synthetic_frames(args.frq)  # noqa: E731
+    server = ReplayServer(
+        source,
+        rate=args.rate,
+        restamp=not args.keep_timestamps,
+        fragment=args.fragment,
+        coalesce=args.coalesce,
+        disconnect=args.disconnect,
+        max_gap=args.max_gap,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logging.info("Replay stopped.")
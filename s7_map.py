@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Seed rows in a data block of a Siemens S7 PLC, read and written field by field
+# with read_multi_vars/write_multi_vars instead of whole-block reads.
+
+import ctypes
+import struct
+
+try:
+    from snap7.types import S7DataItem
+except ImportError:  # python-snap7 2.x
+    from snap7.type import S7DataItem
+
+S7_AREA_DB = 0x84
+S7_WL_BIT = 0x01
+S7_WL_BYTE = 0x02
+MAX_VARS = 20  # items per multi-var request, limit of snap7
+DEFAULT_PDU_LENGTH = 240  # S7-1200; connect() negotiates the actual length
+
+# bytes of the layout types; BOOL takes one bit of a byte
+TYPE_SIZES = {"BOOL": 1, "BYTE": 1, "INT": 2, "DINT": 4, "REAL": 4, "LREAL": 8}
+
+
+def parse_layout(layout: str) -> dict:
+    """{name: (byte, bit, type)} of a snap7.util.DB specification, bit 0 if not BOOL"""
+    fields = {}
+    for line in layout.splitlines():
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        offset, name, type_ = line.split()
+        type_ = type_.upper()
+        if type_ not in TYPE_SIZES:
+            raise ValueError(f"type {type_} of {name} is not supported")
+        byte, _, bit = offset.partition(".")
+        fields[name] = (int(byte), int(bit or 0), type_)
+    return fields
+
+
+def plan_items(amounts, pdu_length: int, write: bool = False) -> list:
+    """Split items of these byte amounts into as few multi-var requests as fit a PDU.
+
+    Returns lists of item indexes. A read request takes 12 bytes per item and
+    its response 4 bytes plus the data, padded to even; a write request takes
+    both. At most MAX_VARS items go into one request.
+    """
+    chunks, chunk, request, response = [], [], 12, 14
+    for k, amount in enumerate(amounts):
+        data = 4 + amount + amount % 2
+        item_request = 12 + (data if write else 0)
+        item_response = 0 if write else data
+        if chunk and (
+            len(chunk) == MAX_VARS
+            or request + item_request > pdu_length
+            or response + item_response > pdu_length
+        ):
+            chunks.append(chunk)
+            chunk, request, response = [], 12, 14
+        chunk.append(k)
+        request += item_request
+        response += item_response
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _item(db_number: int, word_len: int, start: int, amount: int, address: int):
+    item = S7DataItem()
+    item.Area = S7_AREA_DB
+    item.WordLen = word_len
+    item.Result = 0
+    item.DBNumber = db_number
+    item.Start = start
+    item.Amount = amount
+    item.pData = ctypes.cast(address, ctypes.POINTER(ctypes.c_uint8))
+    return item
+
+
+def _check(items, what: str):
+    for item in items:
+        if item.Result:
+            raise RuntimeError(
+                f"{what} at byte {item.Start} of DB {item.DBNumber}: error {item.Result:#x}"
+            )
+
+
+def _write(client, items, what: str):
+    """write_multi_vars() of an S7DataItem array, raising RuntimeError on any failed item.
+
+    python-snap7 1.x and 2.x copy the items before they call the library, so
+    the Result codes would be lost; there the library is called with the array
+    itself. python-snap7 3.x raises on a failed item.
+    """
+    library = getattr(client, "_lib", None)
+    pointer = getattr(client, "_s7_client", None)
+    if library is not None and pointer is not None:
+        result = library.Cli_WriteMultiVars(
+            pointer, ctypes.byref(items), ctypes.c_int32(len(items))
+        )
+    else:
+        result = client.write_multi_vars(items)
+    if result:
+        raise RuntimeError(f"{what}: error {result:#x}")
+    _check(items, what)
+
+
+class SeedBlockMap:
+    """Offsets of the seed fields in a data block, precomputed from `layout`.
+
+    Every row holds enforceSeed and uncertainSeed (BOOL), x, y, a (LREAL, one
+    after another) and the flags recordSeed (teach) and setSeed (BOOL).
+    read_controls() reads only the bytes holding the flags of every row, into
+    one preallocated buffer; the pose of a seed is only read for a set
+    request, and flags are cleared by bit writes that leave the other flags in
+    the byte alone.
+    """
+
+    def __init__(
+        self,
+        db_number: int,
+        seed_num: int,
+        row_size: int,
+        layout: str,
+        pdu_length: int = DEFAULT_PDU_LENGTH,
+    ):
+        self.db_number = db_number
+        self.seed_num = seed_num
+        self.row_size = row_size
+        fields = parse_layout(layout)
+        self.fields = fields
+        x, y, a = fields["x"], fields["y"], fields["a"]
+        if (x[2], y[2], a[2]) != ("LREAL",) * 3 or (y[0], a[0]) != (
+            x[0] + 8,
+            x[0] + 16,
+        ):
+            raise ValueError("x, y, a must be consecutive LREALs")
+        self.pose_start = x[0]
+        self.pose = struct.Struct(">ddd")
+        # bytes holding recordSeed and setSeed in a row
+        flags = [fields["recordSeed"], fields["setSeed"]]
+        self.control_start = min(byte for byte, _, _ in flags)
+        self.control_size = max(byte for byte, _, _ in flags) - self.control_start + 1
+        # bytes read for a set request: enforceSeed, uncertainSeed and the pose
+        names = ("enforceSeed", "uncertainSeed", "x", "y", "a")
+        self.seed_start = min(fields[name][0] for name in names)
+        self.seed_size = (
+            max(fields[name][0] + TYPE_SIZES[fields[name][2]] for name in names)
+            - self.seed_start
+        )
+        self.controls = (ctypes.c_uint8 * (seed_num * self.control_size))()
+        self._zero = ctypes.c_uint8(0)
+        self.set_pdu_length(pdu_length)
+
+    def set_pdu_length(self, pdu_length: int):
+        """Plan the control reads for the PDU length negotiated by connect()"""
+        self.pdu_length = pdu_length
+        base = ctypes.addressof(self.controls)
+        items = [
+            _item(
+                self.db_number,
+                S7_WL_BYTE,
+                self.row_start(i) + self.control_start,
+                self.control_size,
+                base + i * self.control_size,
+            )
+            for i in range(self.seed_num)
+        ]
+        self._control_reads = [
+            (S7DataItem * len(chunk))(*[items[k] for k in chunk])
+            for chunk in plan_items([self.control_size] * self.seed_num, pdu_length)
+        ]
+
+    def row_start(self, i: int) -> int:
+        return i * self.row_size
+
+    def _flag(self, i: int, name: str) -> tuple:
+        """Byte address in the data block and bit of a BOOL of seed i"""
+        byte, bit, _ = self.fields[name]
+        return self.row_start(i) + byte, bit
+
+    # transactions, all raising RuntimeError on failure like python-snap7 1.x
+
+    def read_controls(self, client) -> bytes:
+        """Control bytes of all seeds, control_size bytes per seed"""
+        for items in self._control_reads:
+            client.read_multi_vars(items)
+            _check(items, "read flags")
+        return bytes(self.controls)
+
+    def rising(self, previous: bytes, current: bytes, name: str) -> list:
+        """Seeds whose flag is set in current but not in previous"""
+        byte, bit, _ = self.fields[name]
+        offset, mask = byte - self.control_start, 1 << bit
+        size = self.control_size
+        return [
+            i
+            for i in range(self.seed_num)
+            if current[i * size + offset] & mask
+            and not previous[i * size + offset] & mask
+        ]
+
+    def cleared(self, controls: bytes, acks) -> bytes:
+        """controls with the flags of (seed, name) pairs cleared"""
+        controls = bytearray(controls)
+        for i, name in acks:
+            byte, bit, _ = self.fields[name]
+            controls[i * self.control_size + byte - self.control_start] &= ~(1 << bit)
+        return bytes(controls)
+
+    def read_seeds(self, client, seeds) -> dict:
+        """{i: (x, y, a, enforceSeed, uncertainSeed)} of these seeds"""
+        buffer = (ctypes.c_uint8 * (len(seeds) * self.seed_size))()
+        base = ctypes.addressof(buffer)
+        items = [
+            _item(
+                self.db_number,
+                S7_WL_BYTE,
+                self.row_start(i) + self.seed_start,
+                self.seed_size,
+                base + k * self.seed_size,
+            )
+            for k, i in enumerate(seeds)
+        ]
+        for chunk in plan_items([self.seed_size] * len(seeds), self.pdu_length):
+            batch = (S7DataItem * len(chunk))(*[items[k] for k in chunk])
+            client.read_multi_vars(batch)
+            _check(batch, "read seed")
+        data = bytes(buffer)
+        enforce = self.fields["enforceSeed"]
+        uncertain = self.fields["uncertainSeed"]
+        seeds_read = {}
+        for k, i in enumerate(seeds):
+            row = k * self.seed_size - self.seed_start
+            seeds_read[i] = self.pose.unpack_from(data, row + self.pose_start) + (
+                bool(data[row + enforce[0]] >> enforce[1] & 1),
+                bool(data[row + uncertain[0]] >> uncertain[1] & 1),
+            )
+        return seeds_read
+
+    def write_poses(self, client, seeds, x: float, y: float, a: float):
+        """Write the same pose to these seeds"""
+        data = (ctypes.c_uint8 * self.pose.size).from_buffer_copy(
+            self.pose.pack(x, y, a)
+        )
+        items = [
+            _item(
+                self.db_number,
+                S7_WL_BYTE,
+                self.row_start(i) + self.pose_start,
+                self.pose.size,
+                ctypes.addressof(data),
+            )
+            for i in seeds
+        ]
+        for chunk in plan_items([self.pose.size] * len(items), self.pdu_length, True):
+            batch = (S7DataItem * len(chunk))(*[items[k] for k in chunk])
+            _write(client, batch, "write pose")
+
+    def clear_flags(self, client, acks):
+        """Clear the BOOLs of (seed, name) pairs with bit writes"""
+        items = []
+        for i, name in acks:
+            byte, bit = self._flag(i, name)
+            items.append(
+                _item(
+                    self.db_number,
+                    S7_WL_BIT,
+                    byte * 8 + bit,
+                    1,
+                    ctypes.addressof(self._zero),
+                )
+            )
+        for chunk in plan_items([1] * len(items), self.pdu_length, True):
+            batch = (S7DataItem * len(chunk))(*[items[k] for k in chunk])
+            _write(client, batch, "clear flag")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Conversion between holding registers and seed control bits / poses
+#
+# Control bits: every seed has 4 flags, [enforceSeed, uncertainSeed, teachSeed,
+# setSeed], packed LSB first, so register i // 4 holds seed i in bits
+# (i % 4) * 4 .. (i % 4) * 4 + 3. Control registers are plain 16-bit words;
+# byte_order and word_order only apply to the float32 poses.
+
+import struct
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # the batch functions below need NumPy
+    np = None
+
+ENFORCE_SEED, UNCERTAIN_SEED, TEACH_SEED, SET_SEED = range(4)
+FLAGS_PER_SEED = 4
+SEEDS_PER_REGISTER = 16 // FLAGS_PER_SEED
+
+# 4 flags of every possible nibble, LSB first
+_NIBBLES = tuple(tuple(bool(n >> bit & 1) for bit in range(4)) for n in range(16))
+_SHIFTS = (0, 4, 8, 12)
+
+
+def flag_position(i: int, flag: int) -> tuple:
+    """Register index and bit mask of a flag of seed i"""
+    return i // SEEDS_PER_REGISTER, 1 << ((i % SEEDS_PER_REGISTER) * 4 + flag)
+
+
+def rising_edges(previous, current, flag: int) -> list:
+    """Seeds whose flag changed from 0 to 1 between two reads of the control registers"""
+    mask = 0x1111 << flag
+    seeds = []
+    for register, (a, b) in enumerate(zip(previous, current)):
+        rising = ~a & b & mask
+        while rising:
+            low = rising & -rising
+            seeds.append(register * SEEDS_PER_REGISTER + (low.bit_length() - 1) // 4)
+            rising ^= low
+    return seeds
+
+
+def decode_bits(registers):
+    """Decode holding registers into [enforceSeed, uncertainSeed, teachSeed, setSeed] per seed"""
+    nibbles = _NIBBLES
+    return [list(nibbles[r >> s & 0xF]) for r in registers for s in _SHIFTS]
+
+
+def encode_bits(bits_list, byte_order=">", word_order="<"):
+    """Encode [enforceSeed, uncertainSeed, teachSeed, setSeed] per seed into holding registers"""
+    registers = [0] * -(-len(bits_list) // SEEDS_PER_REGISTER)
+    for i, flags in enumerate(bits_list):
+        nibble = (
+            (flags[0] and 1) | (flags[1] and 2) | (flags[2] and 4) | (flags[3] and 8)
+        )
+        registers[i >> 2] |= nibble << ((i & 3) << 2)
+    return registers
+
+
+@lru_cache(maxsize=None)
+def pose_structs(byte_order: str, word_order: str, count: int = 1) -> tuple:
+    """struct pair converting count poses between float32 and registers.
+
+    The floats are packed with word_order; reading those bytes as registers
+    in the same order as the bytes within a word (byte_order) yields exactly
+    the registers of pymodbus' BinaryPayloadBuilder for that combination.
+    """
+    register_order = ">" if byte_order == word_order else "<"
+    return (
+        struct.Struct(f"{word_order}{3 * count}f"),
+        struct.Struct(f"{register_order}{6 * count}H"),
+    )
+
+
+def decode_pose(registers, byte_order, word_order):
+    """Decode 6 holding registers into [x, y, yaw]"""
+    floats, words = pose_structs(byte_order, word_order)
+    return list(floats.unpack(words.pack(*registers)))
+
+
+def encode_pose(pose, byte_order, word_order):
+    """Encode a pose into 6 holding registers"""
+    floats, words = pose_structs(byte_order, word_order)
+    return list(words.unpack(floats.pack(pose.x, pose.y, pose.yaw)))
+
+
+def decode_poses(registers, byte_order, word_order):
+    """Decode the registers of consecutive seeds into [[x, y, yaw], ...]"""
+    count = len(registers) // 6
+    floats, words = pose_structs(byte_order, word_order, count)
+    values = floats.unpack(words.pack(*registers[: 6 * count]))
+    return [list(values[k : k + 3]) for k in range(0, 3 * count, 3)]
+
+
+# NumPy batch path, for many seeds or many PLCs at once
+
+
+def decode_bits_array(registers):
+    """Flags of all seeds as a bool array of shape (seeds, 4)"""
+    regs = np.asarray(registers, dtype=np.uint16)
+    bits = (regs[:, None] >> np.arange(16, dtype=np.uint16)) & 1
+    return bits.astype(bool).reshape(-1, FLAGS_PER_SEED)
+
+
+def encode_bits_array(flags):
+    """Registers of a bool array of shape (seeds, 4)"""
+    flags = np.asarray(flags, dtype=np.uint16).reshape(-1)
+    padding = -len(flags) % 16
+    if padding:
+        flags = np.concatenate([flags, np.zeros(padding, dtype=np.uint16)])
+    weights = np.left_shift(np.uint16(1), np.arange(16, dtype=np.uint16))
+    return (flags.reshape(-1, 16) * weights).sum(axis=1).astype(np.uint16).tolist()
+
+
+def decode_poses_array(registers, byte_order, word_order):
+    """Poses of consecutive seeds as a float32 array of shape (seeds, 3)"""
+    register_order = ">" if byte_order == word_order else "<"
+    raw = np.asarray(registers, dtype=np.uint16).astype(f"{register_order}u2")
+    return np.frombuffer(raw.tobytes(), dtype=f"{word_order}f4").reshape(-1, 3)
@@ -8,25 +8,22 @@
 # https://realpython.com/intro-to-python-threading/#producer-consumer-using-lock
 
 import socket
-import struct
 import argparse
-from datetime import datetime
 import time
 import logging
-import requests
 
 import json
-import math
 from pymodbus.client import ModbusTcpClient
 
 # from pymodbus.constants import Endian
 from pymodbus.exceptions import ModbusException, ConnectionException
 from pymodbus.pdu import ExceptionResponse
-from pymodbus.payload import BinaryPayloadDecoder, BinaryPayloadBuilder
-from bitstring import BitArray
-import sys
 import threading
-
+from locator_pose import PoseStreamReader, LatestPose, PoseDeadband
+from locator_rpc import LocatorRpcClient, RpcError
+from seed_codec import encode_pose
+from seed_codec import TEACH_SEED, SET_SEED
+from modbus_map import SeedRegisterMap
 
 # Locator
 config = {
@@ -40,22 +37,24 @@ config = {
     "bits_starting_addr": 16,
     "poses_starting_addr": 32,
     "seed_num": 16,
+    "max_read_gap": 16,  # unused registers read to merge bits and poses in one read
+    "mask_write": 0,  # 1: acknowledge with function 22, mask write register
     "byte_order": ">",
     "word_order": "<",
+    "seed0_deadband_xy": 0.005,  # meter
+    "seed0_deadband_yaw": 0.0087,  # radian, 0.5 degrees
+    "seed0_min_interval": 0.1,  # second
+    "seed0_max_interval": 10.0,  # second, heartbeat
     "debug": 0,
 }
 
-# ClientLocalizationPoseDatagram data structure (see API manual)
-unpacker = struct.Struct("<ddQiQQddddddddddddddQddd")
 # print(datetime.now())
 
-id = 0
-pose = {}
+latest_pose = LatestPose()
 
 
 def get_client_localization_pose(host, port):
-    """Receive localization poses from ROKIT Locator and save them to a global variable, pose"""
-    global pose
+    """Receive localization poses from ROKIT Locator and publish them to latest_pose"""
 
     def connect_socket():
         while True:
@@ -75,29 +74,19 @@ def get_client_localization_pose(host, port):
                 time.sleep(5)
 
     client = connect_socket()
+    reader = PoseStreamReader()
+    tic = time.monotonic()
     while True:
         try:
-            data = client.recv(unpacker.size)
-            if not data:
-                continue
-            unpacked_data = unpacker.unpack(data)
-
-            # create a json row
-            pose = {
-                "timestamp": datetime.fromtimestamp(unpacked_data[1]).strftime(
-                    "%d-%m-%Y-%H-%M-%S"
-                ),
-                "x": unpacked_data[6],
-                "y": unpacked_data[7],
-                # 'yaw': math.degrees(unpacked_data[8]),
-                "yaw": unpacked_data[8],
-                "localization_state": unpacked_data[3],
-            }
-            logging.debug(pose)
+            for offset in reader.read_frames(client):
+                pose = latest_pose.publish(reader.unpack(offset))
+                # formatted only if debug logging is enabled
+                logging.debug(pose)
+                if time.monotonic() - tic >= 60:
+                    logging.info(f"pose stream {reader.stats()}")
+                    tic = time.monotonic()
         # except TimeoutError as e:
         #     logging.warning(e)
-        except struct.error as e:
-            logging.exception(e)
         # except OSError as e:
         except (TimeoutError, OSError) as e:
             logging.exception(e)
@@ -105,116 +94,32 @@ def get_client_localization_pose(host, port):
                 client.close()
             time.sleep(5)
             client = connect_socket()
+            reader.reset()
 
 
-def clientLocalizationSetSeed(
-    sessionId: str,
-    x: float,
-    y: float,
-    a: float,
-    enforceSeed: bool = False,
-    uncertainSeed: bool = False,
-):
-    global id
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "clientLocalizationSetSeed",
-        "params": {
-            "query": {
-                "sessionId": sessionId,
-                "enforceSeed": enforceSeed,
-                "uncertainSeed": uncertainSeed,
-                "seedPose": {"x": x, "y": y, "a": a},
-            }
-        },
-    }
-    id = id + 1
-    logging.debug(payload)
-
-    logging.debug(f"x={x}, y={y}, a={a}")
-    response = requests.post(url=url, json=payload)
-    logging.debug(response.json())
-    if response.json()["result"]["response"]["responseCode"] == 0:
-        return True
-    else:
-        return False
-
-
-def sessionLogin() -> str:
-    global id
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "sessionLogin",
-        "params": {
-            "query": {
-                "timeout": {  # timeout, not timestamp
-                    "valid": True,
-                    "time": 60,  # Integer64
-                    "resolution": 1,  # real_time = time / resolution
-                },
-                "userName": config["user_name"],
-                "password": config["password"],
-            }
-        },
-    }
-    id = id + 1
-    logging.debug(payload)
-    response = requests.post(url=url, json=payload)
-    logging.debug(response.json())
-    sessionId = response.json()["result"]["response"]["sessionId"]
-    return sessionId  # an empty string in case of a sessionLogin failure
+def update_seed_0(host, port, address, byte_order, word_order, deadband):
+    """Update seed 0, the last pose, in the holding registers of the PLC.
 
-
-def sessionLogout(sessionId: str = None):
-    global id
-    # headers = {
-    #     "Content-Type": "application/json; charset=utf-8",
-    # }
-
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "sessionLogout",
-        "params": {"query": {"sessionId": sessionId}},
-    }
-    id = id + 1
-
-    response = requests.post(url=url, json=payload)
-    logging.debug(response.json())
-    if response.json()["result"]["response"]["responseCode"] == 0:
-        return True
-    else:
-        return False
-
-
-def update_seed_0(host, port, address, byte_order, word_order):
-    """Update the first seed in table seeds of locator.db"""
-    global pose
+    The writer wakes on every new pose and writes it when it is outside the
+    deadband, limited by deadband.min_interval and deadband.max_interval.
+    """
     # Set up the Modbus client
     client = ModbusTcpClient(host, port)
-    pose_a = {}
+    seq = 0
     while True:
         try:
-            if "localization_state" in pose and pose["localization_state"] >= 2:
-                pose_b = pose
-                # units: meter and radian, 0.0087 radians = 0.5 degrees
-                if (
-                    pose_a == {}
-                    or abs(pose_b["x"] - pose_a["x"]) > 0.005
-                    or abs(pose_b["y"] - pose_a["y"]) > 0.005
-                    or abs(pose_b["yaw"] - pose_a["yaw"]) > 0.0087
-                ):
-                    assert client.connect(), "Modbus connection failed."
-                    assert mb_set_pose(
-                        client, address, pose_b, byte_order, word_order
-                    ), "Could not update pose of seed 0."
-                    logging.info(
-                        f"seed 0 updated, x={pose_b['x']}, y={pose_b['y']}, yaw={pose_b['yaw']}"
-                    )
-                    pose_a = pose_b
-            time.sleep(0.5)
+            pose_b = deadband.next_pose(latest_pose, seq)
+            if pose_b is None:
+                continue
+            seq = pose_b.seq
+            assert client.connect(), "Modbus connection failed."
+            assert mb_set_pose(
+                client, address, pose_b, byte_order, word_order
+            ), "Could not update pose of seed 0."
+            deadband.mark_written(pose_b, time.monotonic())
+            logging.debug(
+                f"seed 0 updated, x={pose_b.x}, y={pose_b.y}, yaw={pose_b.yaw}"
+            )
         except (AssertionError, ConnectionException) as e:
             logging.warning(e)
             time.sleep(3)
@@ -229,125 +134,89 @@ def teach_or_set_seed(
     byte_order,
     word_order,
 ):
-    global pose
-    bits_a = []
-    bits_b = []
     # Set up the Modbus client
     client = ModbusTcpClient(host, port)
+    # shadow copy of bits and poses, refreshed by one read per cycle
+    regmap = SeedRegisterMap(
+        bits_starting_addr,
+        poses_starting_addr,
+        seed_num,
+        byte_order,
+        word_order,
+        config["max_read_gap"],
+        bool(config["mask_write"]),
+    )
+    logging.info(f"seed registers are read in blocks (start, count) {regmap.reads}")
 
-    bits_a = {}
+    regs_a = None
     while True:
         try:
             assert client.connect(), "Modbus connection failed."
-            if bits_a == {}:
-                bits_a = mb_get_bits(
-                    bits_starting_addr, seed_num, client, byte_order, word_order
-                )
-                assert bits_a, "Could not get seed bits_a."
+            if regs_a is None:
+                assert regmap.poll(client), "Could not read seed registers."
+                regs_a = regmap.previous_bits()
             time.sleep(0.5)
-            bits_b = mb_get_bits(
-                bits_starting_addr, seed_num, client, byte_order, word_order
-            )
-            assert bits_b, "Could not get seed bits_b."
-            if bits_b == bits_a:
+            assert regmap.poll(client), "Could not read seed registers."
+            taught = regmap.rising(regs_a, TEACH_SEED)
+            to_set = regmap.rising(regs_a, SET_SEED)
+            if not taught and not to_set:
+                regs_a = regmap.previous_bits()
                 continue
-            logging.debug(f"bits_a, length={len(bits_a)}: {bits_a}")
-            logging.debug(f"bits_b, length={len(bits_b)}: {bits_b}")
-            for i in range(len(bits_b)):
-                # teach seed
-                if not bits_a[i][2] and bits_b[i][2]:
-                    # read current pose from Locator and write it to pose i in the data block
-                    pose_current = pose
-                    assert pose_current["localization_state"] >= 2, "NOT_LOCALIZED"
-                    assert mb_set_pose(
-                        client,
-                        poses_starting_addr + i * 6,
-                        pose_current,
-                        byte_order,
-                        word_order,
-                    ), f"Could not set pose of seed {i}."
-                    logging.info(
-                        f"seed {i} taught, x={pose_current['x']}, y={pose_current['y']}, yaw={pose_current['yaw']}"
-                    )
-                    # reset bit teachSeed in modbus data block
-                    bits_b[i][2] = False
-                    logging.debug(f"bits_b, length={len(bits_b)}: {bits_b}")
-                    assert mb_set_bits(
-                        client,
-                        bits_starting_addr,
-                        bits_b,
-                        byte_order,
-                        word_order,
-                    ), "Could not set bits."
-                    break
-
-                # set seed
-                if not bits_a[i][3] and bits_b[i][3]:
-                    seed_pose = mb_get_pose(
-                        poses_starting_addr, i, client, byte_order, word_order
-                    )
-                    assert seed_pose, "Could not get pose of seed {i}."
-                    session_id = sessionLogin()
-                    assert session_id, "Locator client session login failed."
-                    assert clientLocalizationSetSeed(
-                        sessionId=session_id,
+            logging.debug(f"rising teachSeed {taught}, setSeed {to_set}")
+            acks, unhandled = [], []
+            # teach seeds, all with the same current pose from Locator
+            pose_current = latest_pose.latest
+            if taught and (pose_current is None or not pose_current.is_localized()):
+                logging.warning(f"NOT_LOCALIZED, seeds {taught} not taught")
+                unhandled += [(i, TEACH_SEED) for i in taught]
+            elif taught:
+                for i in taught:
+                    regmap.stage_pose(i, pose_current)
+                assert regmap.flush(client), f"Could not set poses of seeds {taught}."
+                acks += [(i, TEACH_SEED) for i in taught]
+                logging.info(
+                    f"seeds {taught} taught, x={pose_current.x}, y={pose_current.y}, yaw={pose_current.yaw}"
+                )
+            # set seeds
+            bits = regmap.bits()
+            for i in to_set:
+                seed_pose = regmap.pose(i)
+                try:
+                    ok = rpc.set_seed(
                         x=seed_pose[0],
                         y=seed_pose[1],
                         a=seed_pose[2],
-                        enforceSeed=bits_b[i][0],
-                        uncertainSeed=bits_b[i][1],
-                    ), "Setting seed failed."
-                    assert sessionLogout(
-                        session_id
-                    ), "Locator client session logout failed."
-                    logging.info(
-                        f"seed {i} set, x={seed_pose[0]}, y={seed_pose[1]}, yaw={seed_pose[2]}"
+                        enforceSeed=bits[i][0],
+                        uncertainSeed=bits[i][1],
                     )
-                    # reset bit setSeed in modbus data block
-                    bits_b[i][3] = False
-                    assert mb_set_bits(
-                        client,
-                        bits_starting_addr,
-                        bits_b,
-                        byte_order,
-                        word_order,
-                    ), "Could not set bits."
-                    break
-            # bits_b != bits_a, but no changing from False to True
-            bits_a = bits_b
-        except (AssertionError, ConnectionException) as e:
+                except RpcError as e:
+                    logging.warning(e)
+                    ok = False
+                if not ok:
+                    logging.warning(f"Setting seed {i} failed.")
+                    unhandled.append((i, SET_SEED))
+                    continue
+                logging.info(
+                    f"seed {i} set, x={seed_pose[0]}, y={seed_pose[1]}, yaw={seed_pose[2]}"
+                )
+                acks.append((i, SET_SEED))
+            if to_set:
+                logging.debug(f"JSON RPC latency {rpc.metrics.summary()}")
+            # reset bits teachSeed and setSeed in modbus data block at once
+            assert regmap.ack(client, acks), "Could not reset bits."
+            regs_a = regmap.previous_bits(unhandled)
+            logging.info(
+                f"{len(acks)} of {len(taught) + len(to_set)} edges handled in one cycle"
+            )
+            if unhandled:
+                time.sleep(3)
+        except (AssertionError, ConnectionException, RpcError) as e:
             logging.warning(e)
             time.sleep(3)
 
 
-def mb_get_pose(poses_starting_addr, i, client, byte_order, word_order):
-    try:
-        rr = client.read_holding_registers(poses_starting_addr + i * 6, 6)
-    except ModbusException as exc:
-        print(f"Received ModbusException({exc}) from library")
-        return False
-    if rr.isError():  # pragma no cover
-        print(f"Received Modbus library error({rr})")
-        return False
-    if isinstance(rr, ExceptionResponse):  # pragma no cover
-        print(f"Received Modbus library exception ({rr})")
-        # THIS IS NOT A PYTHON EXCEPTION, but a valid modbus message
-        return False
-    decoder = BinaryPayloadDecoder.fromRegisters(
-        rr.registers, byteorder=byte_order, wordorder=word_order
-    )
-    pose_x = decoder.decode_32bit_float()
-    pose_y = decoder.decode_32bit_float()
-    pose_yaw = decoder.decode_32bit_float()
-    return [pose_x, pose_y, pose_yaw]
-
-
 def mb_set_pose(client, address, pose, byte_order, word_order):
-    builder = BinaryPayloadBuilder(byteorder=byte_order, wordorder=word_order)
-    builder.add_32bit_float(pose["x"])
-    builder.add_32bit_float(pose["y"])
-    builder.add_32bit_float(pose["yaw"])
-    registers = builder.to_registers()
+    registers = encode_pose(pose, byte_order, word_order)
     try:
         rr = client.write_registers(address, registers)
     except ModbusException as exc:
@@ -363,78 +232,6 @@ def mb_set_pose(client, address, pose, byte_order, word_order):
     return True
 
 
-def mb_get_bits(bits_starting_addr, seed_num, client, byte_order, word_order):
-    bits_list = []
-    bits = BitArray()
-    bits_register_count = math.ceil(seed_num * 4 / 16)
-    try:
-        rr = client.read_holding_registers(bits_starting_addr, bits_register_count)
-    except ModbusException as exc:
-        print(f"Received ModbusException({exc}) from library")
-        return False
-    if rr.isError():  # pragma no cover
-        print(f"Received Modbus library error({rr})")
-        return False
-    if isinstance(rr, ExceptionResponse):  # pragma no cover
-        print(f"Received Modbus library exception ({rr})")
-        # THIS IS NOT A PYTHON EXCEPTION, but a valid modbus message
-        return False
-
-    # decoder = BinaryPayloadDecoder.fromRegisters(
-    #     result.registers, byteorder=byte_order, wordorder=word_order
-    # )
-    for register in rr.registers:
-        bit_16 = BitArray(uint=register, length=16)
-        bit_16.reverse()
-        bits.append(bit_16)
-    for bit_4 in bits.cut(4):
-        bit_4_list = [bit == "1" for bit in bit_4.bin]
-        bits_list.append(bit_4_list)
-    # logging.debug(bits_list)
-    # for i in range(math.ceil(seed_num*4/8)):
-    #     t = decoder.decode_bits()
-    #     # make a list of [enforceSeed, uncertainSeed, teachSeed, setSeed]
-    #     bits.append(t[:4])
-    #     bits.append(t[4:])
-    return bits_list
-
-
-def mb_set_bits(client, bits_starting_addr, bits_list, byte_order, word_order):
-    """_summary_
-
-    Args:
-        bits_starting_addr (uint): _description_
-        bits_list (list): a two-dimentional array
-        client (ModbusTcpClient): _description_
-    """
-    bool_list = [item for sublist in bits_list for item in sublist]
-    bits = BitArray()
-    for bool_val in bool_list:
-        bits.append("0b1" if bool_val else "0b0")
-    builder = BinaryPayloadBuilder(byteorder=byte_order, wordorder=word_order)
-    for bits_16 in bits.cut(16):
-        bits_16.reverse()
-        builder.add_16bit_uint(bits_16.uint)
-    registers = builder.to_registers()
-    try:
-        # TODO any return?
-        rr = client.write_registers(bits_starting_addr, registers)
-    except ModbusException as exc:
-        print(f"Received ModbusException({exc}) from library")
-        # client.close()
-        return False
-    if rr.isError():  # pragma no cover
-        print(f"Received Modbus library error({rr})")
-        # client.close()
-        return False
-    if isinstance(rr, ExceptionResponse):  # pragma no cover
-        print(f"Received Modbus library exception ({rr})")
-        # THIS IS NOT A PYTHON EXCEPTION, but a valid modbus message
-        # client.close()
-        return False
-    return True
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="a program to teach and set seeds for ROKIT Locator",
@@ -509,6 +306,7 @@ if __name__ == "__main__":
     url = (
         "http://" + config["locator_host"] + ":" + str(config["locator_json_rpc_port"])
     )
+    rpc = LocatorRpcClient(url, config["user_name"], config["password"])
 
     # format = "%(asctime)s [%(levelname)s] %(threadName)s %(message)s"
     format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
@@ -533,6 +331,7 @@ if __name__ == "__main__":
             config["poses_starting_addr"],
             config["byte_order"],
             config["word_order"],
+            PoseDeadband.from_config(config),
         ),
     )
     x3 = threading.Thread(
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# asyncio version of seed_modbus.py: pose ingest, seed 0 updates and teach/set
+# edge detection run as coroutines of one event loop instead of three threads.
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import socket
+import time
+
+import aiohttp
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
+from pymodbus.pdu import ExceptionResponse
+
+import seed_modbus
+from locator_pose import AsyncLatestPose, PoseDeadband, PoseStreamReader
+from locator_rpc import AsyncLocatorRpcClient, RpcError
+from modbus_map import SeedRegisterMap
+from seed_codec import SET_SEED, TEACH_SEED, encode_pose
+
+
+class BridgeError(Exception):
+    """A recoverable failure talking to Locator or the PLC"""
+
+
+def check_response(rr, what: str):
+    if rr.isError() or isinstance(rr, ExceptionResponse):
+        raise BridgeError(f"{what}: Modbus error {rr}")
+    return rr
+
+
+class ModbusBridge:
+    """Bridge between one ROKIT Locator and one Modbus PLC, run by one event loop"""
+
+    def __init__(self, config: dict, name: str = None):
+        self.config = config
+        self.name = name or config["plc_host"]
+        self.url = f"http://{config['locator_host']}:{config['locator_json_rpc_port']}"
+        self.deadband = PoseDeadband.from_config(config)
+        self.regmap = SeedRegisterMap.from_config(config)
+        self.latest_pose = None
+        self.plc = None
+        self.rpc = None
+        self._plc_lock = None
+        self.stats = {
+            "poses": 0,
+            "seed0_writes": 0,
+            "taught": 0,
+            "set": 0,
+            "errors": 0,
+            "last_error": "",
+        }
+
+    async def run(self, http: aiohttp.ClientSession = None):
+        """Run all coroutines of the bridge until it is cancelled.
+
+        A ClientSession may be passed in to share its connection pool with
+        other bridges in the same process.
+        """
+        self.latest_pose = AsyncLatestPose()
+        self._plc_lock = asyncio.Lock()
+        self.plc = AsyncModbusTcpClient(
+            self.config["plc_host"], port=self.config["plc_port"]
+        )
+        own_http = http is None
+        if own_http:
+            http = aiohttp.ClientSession()
+        self.rpc = AsyncLocatorRpcClient(
+            http, self.url, self.config["user_name"], self.config["password"]
+        )
+        tasks = [
+            asyncio.ensure_future(coroutine)
+            for coroutine in (
+                self.pose_ingest(),
+                self.update_seed_0(),
+                self.teach_or_set_seed(),
+            )
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # a failure of one coroutine stops the others as well
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.plc.close()
+            try:
+                await self.rpc.logout()
+            except RpcError as e:
+                logging.warning(f"{self.name}: {e}")
+            if own_http:
+                await http.close()
+
+    def _warn(self, e):
+        self.stats["errors"] += 1
+        self.stats["last_error"] = str(e)
+        logging.warning(f"{self.name}: {e}")
+
+    # ROKIT Locator binary pose stream
+
+    async def _connect_pose(self) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(
+                loop.sock_connect(
+                    sock,
+                    (self.config["locator_host"], self.config["locator_pose_port"]),
+                ),
+                5,
+            )
+        except BaseException:
+            sock.close()
+            raise
+        logging.info(
+            f"{self.name}: Local address: {sock.getsockname()} <-connected-> Remote address: {sock.getpeername()}"
+        )
+        return sock
+
+    async def pose_ingest(self):
+        """Receive localization poses from ROKIT Locator and publish them to latest_pose"""
+        loop = asyncio.get_running_loop()
+        reader = PoseStreamReader()
+        while True:
+            sock = None
+            try:
+                sock = await self._connect_pose()
+                reader.reset()
+                while True:
+                    nbytes = await asyncio.wait_for(
+                        loop.sock_recv_into(sock, reader.free_view()), 5
+                    )
+                    if not nbytes:
+                        raise ConnectionError("Locator closed the pose stream")
+                    reader.advance(nbytes)
+                    for offset in reader.pending_frames():
+                        pose = self.latest_pose.publish(reader.unpack(offset))
+                        self.stats["poses"] += 1
+                        logging.debug(pose)
+            except (asyncio.TimeoutError, OSError) as e:
+                self._warn(f"pose stream, {e!r}")
+            finally:
+                if sock:
+                    sock.close()
+            await asyncio.sleep(5)
+
+    # PLC holding registers
+
+    async def _connect_plc(self):
+        if not self.plc.connected and not await self.plc.connect():
+            raise BridgeError("Modbus connection failed.")
+
+    async def _plc_call(self, what: str, method, *args, **kwargs):
+        async with self._plc_lock:
+            await self._connect_plc()
+            try:
+                rr = await method(*args, **kwargs)
+            except ModbusException as e:
+                raise BridgeError(f"{what}: {e}") from e
+        return check_response(rr, what)
+
+    async def poll(self):
+        """Refresh the shadow copy of the seed registers"""
+        async with self._plc_lock:
+            await self._connect_plc()
+            if not await self.regmap.poll_async(self.plc):
+                raise BridgeError("Could not read seed registers.")
+
+    async def ack(self, acks: list):
+        """Clear the teachSeed/setSeed flags of (seed, flag) pairs"""
+        async with self._plc_lock:
+            await self._connect_plc()
+            if not await self.regmap.ack_async(self.plc, acks):
+                raise BridgeError(f"Could not reset bits {acks}.")
+
+    async def flush(self, what: str):
+        """Write the staged seed registers"""
+        async with self._plc_lock:
+            await self._connect_plc()
+            if not await self.regmap.flush_async(self.plc):
+                raise BridgeError(f"Could not {what}.")
+
+    async def set_pose(self, i: int, pose):
+        registers = encode_pose(
+            pose, self.config["byte_order"], self.config["word_order"]
+        )
+        await self._plc_call(
+            f"write pose of seed {i}",
+            self.plc.write_registers,
+            self.config["poses_starting_addr"] + i * 6,
+            registers,
+        )
+
+    async def update_seed_0(self):
+        """Write the last pose to seed 0 whenever it leaves the deadband"""
+        seq = 0
+        while True:
+            try:
+                pose = await self.deadband.next_pose_async(self.latest_pose, seq)
+                if pose is None:
+                    continue
+                seq = pose.seq
+                await self.set_pose(0, pose)
+                self.deadband.mark_written(pose, time.monotonic())
+                self.stats["seed0_writes"] += 1
+                logging.debug(
+                    f"{self.name}: seed 0 updated, x={pose.x}, y={pose.y}, yaw={pose.yaw}"
+                )
+            except BridgeError as e:
+                self._warn(e)
+                await asyncio.sleep(3)
+
+    async def teach_or_set_seed(self):
+        regmap = self.regmap
+        regs_a = None
+        while True:
+            try:
+                if regs_a is None:
+                    await self.poll()
+                    regs_a = regmap.previous_bits()
+                await asyncio.sleep(0.5)
+                await self.poll()
+                taught = regmap.rising(regs_a, TEACH_SEED)
+                to_set = regmap.rising(regs_a, SET_SEED)
+                if not taught and not to_set:
+                    regs_a = regmap.previous_bits()
+                    continue
+                acks, unhandled = [], []
+                # teach seeds, all with the same current pose
+                pose = self.latest_pose.latest
+                if taught and (pose is None or not pose.is_localized()):
+                    self._warn(f"NOT_LOCALIZED, seeds {taught} not taught")
+                    unhandled += [(i, TEACH_SEED) for i in taught]
+                elif taught:
+                    for i in taught:
+                        regmap.stage_pose(i, pose)
+                    await self.flush(f"set poses of seeds {taught}")
+                    acks += [(i, TEACH_SEED) for i in taught]
+                    logging.info(
+                        f"{self.name}: seeds {taught} taught, x={pose.x}, y={pose.y}, yaw={pose.yaw}"
+                    )
+                    self.stats["taught"] += len(taught)
+                # set seeds
+                bits = regmap.bits()
+                for i in to_set:
+                    x, y, yaw = regmap.pose(i)
+                    try:
+                        ok = await self.rpc.set_seed(
+                            x,
+                            y,
+                            yaw,
+                            enforceSeed=bits[i][0],
+                            uncertainSeed=bits[i][1],
+                        )
+                    except RpcError as e:
+                        self._warn(e)
+                        ok = False
+                    if not ok:
+                        self._warn(f"Setting seed {i} failed.")
+                        unhandled.append((i, SET_SEED))
+                        continue
+                    logging.info(f"{self.name}: seed {i} set, x={x}, y={y}, yaw={yaw}")
+                    acks.append((i, SET_SEED))
+                    self.stats["set"] += 1
+                # reset bits teachSeed and setSeed in modbus data block at once
+                await self.ack(acks)
+                regs_a = regmap.previous_bits(unhandled)
+                logging.info(
+                    f"{self.name}: {len(acks)} of {len(taught) + len(to_set)} edges handled in one cycle"
+                )
+                if unhandled:
+                    await asyncio.sleep(3)
+            except (BridgeError, RpcError) as e:
+                self._warn(e)
+                await asyncio.sleep(3)
+
+
+async def main(config: dict):
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    await ModbusBridge(config).run()
+
+
+if __name__ == "__main__":
+    config = dict(seed_modbus.config)
+    parser = argparse.ArgumentParser(
+        description="a program to teach and set seeds for ROKIT Locator, asyncio version",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        help="The path to the configuration file",
+    )
+    parser.add_argument(
+        "--debug",
+        type=int,
+        default=config["debug"],
+        help="0: logging.INFO, 1: logging.DEBUG",
+    )
+    args = parser.parse_args()
+    if args.config:
+        with open(args.config, "r") as f:
+            config.update(json.load(f))
+    else:
+        config.update(vars(args))
+
+    format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
+    logging.basicConfig(
+        format=format,
+        level=logging.DEBUG if config["debug"] else logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    try:
+        asyncio.run(main(config))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logging.info("Bridge stopped.")
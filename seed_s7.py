@@ -8,13 +8,24 @@
 
 import socket
 import sys
-import struct
 import argparse
 from datetime import datetime
 import time
 import logging
-import requests
 import snap7
+from locator_pose import PoseStreamReader
+from locator_rpc import LocatorRpcClient, RpcError
+from s7_map import SeedBlockMap
+
+try:
+    from snap7.exceptions import Snap7Exception
+except ImportError:  # python-snap7 1.x and 2.x raise RuntimeError
+    Snap7Exception = RuntimeError
+try:
+    from snap7.error import S7Error  # python-snap7 3.x, pure Python
+except ImportError:
+    S7Error = RuntimeError
+S7_ERRORS = (RuntimeError, OSError, Snap7Exception, S7Error)
 
 # logger = logging.getLogger(__name__)
 
@@ -30,10 +41,7 @@ LOCATOR_BINARY_PORT = 9011
 LOCATOR_JSON_RPC_PORT = 8080
 URL = "http://" + LOCATOR_ADDRESS + ":" + str(LOCATOR_JSON_RPC_PORT)
 
-# ClientLocalizationPoseDatagram data structure (see API manual)
-UNPACKER = struct.Struct("<ddQiQQddddddddddddddQddd")
-
-sessionId = ""  # ROKIT Locator JSON RPC session ID
+rpc = None  # ROKIT Locator JSON RPC client, keeps the session between seeds
 
 # Siemens S7-1200
 PLC_ADDRESS = "192.168.0.235"
@@ -43,7 +51,7 @@ PLC_SLOT = 1
 seed_num = 8  # number of seeds stored in DB
 DB_NUMBER = 10000  # Siemens S7 data block number
 ROW_SIZE = 28  # bytes that a row/seed resides
-POSE_SIZE = 24  # bytes that Pose2D resides in a row/seed
+HEALTH_INTERVAL = 10.0  # seconds between checks of the CPU state
 # row/seed specification in a data block
 layout = """
 0.0     enforceSeed         BOOL
@@ -68,14 +76,21 @@ def readCurrentPoseFromLocator() -> dict:
         sock.connect(server_address)
         logging.info("Connected.")
     except socket.error as e:
-        logging.error(str(e.message))
+        logging.error(e)
         logging.error("Connection to Locator failed...")
+        sock.close()
         return
 
-    # read the socket
-    data = sock.recv(UNPACKER.size)
+    # read the socket until one whole datagram has arrived
+    reader = PoseStreamReader(capacity=2)
+    try:
+        offset = next(reader.read_frames(sock))
+    except (ConnectionError, socket.timeout) as e:
+        logging.error(e)
+        sock.close()
+        return
     # upack the data (= interpret the datagram)
-    unpacked_data = UNPACKER.unpack(data)
+    unpacked_data = reader.unpack(offset)
     logging.debug(unpacked_data)
 
     # create a json row
@@ -94,157 +109,97 @@ def readCurrentPoseFromLocator() -> dict:
     return jsonRow
 
 
-def clientLocalizationSetSeed(
-    sessionId: str,
-    x: float,
-    y: float,
-    a: float,
-    enforceSeed: bool = False,
-    uncertainSeed: bool = False,
-):
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-    }
-
-    payload = {
-        "id": 111,
-        "jsonrpc": "2.0",
-        "method": "clientLocalizationSetSeed",
-        "params": {
-            "query": {
-                "sessionId": sessionId,
-                "enforceSeed": enforceSeed,
-                "uncertainSeed": uncertainSeed,
-                "seedPose": {"x": x, "y": y, "a": a},
-            }
-        },
-    }
-
-    logging.info(f"x={x}, y={y}, a={a}")
-    response = requests.post(url=URL, json=payload, headers=headers)
-    logging.debug(response.json())
-
-
-def sessionLogin() -> str:
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-    }
-    payload = {
-        "id": 101,
-        "jsonrpc": "2.0",
-        "method": "sessionLogin",
-        "params": {
-            "query": {
-                "timeout": {  # timeout, not timestamp
-                    "valid": True,
-                    "time": 60,  # Integer64
-                    "resolution": 1,  # real_time = time / resolution
-                },
-                "userName": user_name,
-                "password": password,
-            }
-        },
-    }
-    logging.debug(payload)
-
-    response = requests.post(url=URL, json=payload, headers=headers)
-    logging.debug(response.json())
-    sessionId = response.json()["result"]["response"]["sessionId"]
-
-    return sessionId
-
-
-def sessionLogout(sessionId: str = None):
-    headers = {
-        "Content-Type": "application/json; charset=utf-8",
-    }
-
-    payload = {
-        "id": 103,
-        "jsonrpc": "2.0",
-        "method": "sessionLogout",
-        "params": {"query": {"sessionId": sessionId}},
-    }
-
-    response = requests.post(url=URL, json=payload, headers=headers)
-    logging.debug(response.json())
-
-
-def run():
-    client = snap7.client.Client()
+def connect(client, blockmap):
     client.connect(PLC_ADDRESS, PLC_RACK, PLC_SLOT, PLC_PORT)
-    all_data_a = client.db_read(1, 0, ROW_SIZE * seed_num)
-    db1_a = snap7.util.DB(
-        db_number=DB_NUMBER,
-        bytearray_=all_data_a,
-        specification=layout,
-        row_size=ROW_SIZE,
-        size=seed_num,
-    )
-    seed_a = db1_a.export()
+    blockmap.set_pdu_length(client.get_pdu_length())
+    logging.info(f"Connected to PLC {PLC_ADDRESS}, PDU {blockmap.pdu_length} bytes")
 
-    while True:
-        time.sleep(0.5)
 
-        all_data_b = client.db_read(1, 0, ROW_SIZE * seed_num)
-        db1_b = snap7.util.DB(
-            db_number=DB_NUMBER,
-            bytearray_=all_data_b,
-            specification=layout,
-            row_size=ROW_SIZE,
-            size=seed_num,
-        )
-        seed_b = db1_b.export()
-        for i in range(seed_num):
-            if not seed_a[i]["recordSeed"] and seed_b[i]["recordSeed"]:
-                # # pose 0 in DB stores current pose
-                # # write pose 0 to pose i in the data block
-                # client.db_write(
-                #     db_number=1,
-                #     start=i*ROW_SIZE+2,
-                #     data=all_data_b[2:2+POSE_SIZE]  # Pose2D in the data block
-                # )
-
-                # read current pose from Locator and write it to pose i in the data block
-                pose = readCurrentPoseFromLocator()
-                assert pose["localization_state"] >= 2, "NOT_LOCALIZED"
-                logging.info("LOCALIZED")
-                logging.info(pose)
-
-                pose_ba = struct.pack(">ddd", pose["x"], pose["y"], pose["yaw"])
-                client.db_write(
-                    db_number=DB_NUMBER,
-                    start=i * ROW_SIZE + 2,
-                    # data=pose_ba+bytearray([0b00000000])
-                    data=pose_ba,
-                )
-
-                # reset recordSeed
-                client.db_write(
-                    db_number=DB_NUMBER,
-                    start=i * ROW_SIZE + 2 + POSE_SIZE,
-                    data=bytearray([0b00000000]),
-                )
-                # client.wait_as_completion(5000)
-                logging.info(f"Seed {i} recorded.")
-                break
-            if not seed_a[i]["setSeed"] and seed_b[i]["setSeed"]:
-                setSeed(
-                    x=seed_b[i]["x"],
-                    y=seed_b[i]["y"],
-                    a=seed_b[i]["a"],
-                    enforceSeed=seed_b[i]["enforceSeed"],
-                    uncertainSeed=seed_b[i]["uncertainSeed"],
-                )
-                logging.info(f"Seed {i} set.")
+def run():
+    """Poll the teach/set flags of all seeds over one persistent connection.
 
-                client.db_write(
-                    db_number=DB_NUMBER,
-                    start=i * ROW_SIZE + 2 + POSE_SIZE,
-                    data=bytearray([0b00000000]),
-                )
-                break
-        seed_a = seed_b
+    Only the control bytes are read every cycle; the pose of a seed is read
+    when its setSeed rises. The connection is checked with the CPU state every
+    HEALTH_INTERVAL seconds and opened again with backoff after an error,
+    keeping the last flags so edges raised meanwhile are still detected.
+    """
+    client = snap7.client.Client()
+    blockmap = SeedBlockMap(DB_NUMBER, seed_num, ROW_SIZE, layout)
+    controls_a = None
+    backoff = 0.5
+    checked = 0.0
+    try:
+        while True:
+            time.sleep(0.5)
+            try:
+                if not client.get_connected():
+                    connect(client, blockmap)
+                elif time.monotonic() - checked >= HEALTH_INTERVAL:
+                    state = client.get_cpu_state()
+                    if state != "S7CpuStatusRun":
+                        logging.warning(f"PLC CPU state {state}")
+                    checked = time.monotonic()
+                controls_b = blockmap.read_controls(client)
+                backoff = 0.5
+            except S7_ERRORS as e:
+                logging.warning(f"{e}, connecting again in {backoff} s")
+                client.disconnect()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            if controls_a is None:
+                controls_a = controls_b
+                continue
+            recorded = blockmap.rising(controls_a, controls_b, "recordSeed")
+            to_set = blockmap.rising(controls_a, controls_b, "setSeed")
+            if not recorded and not to_set:
+                controls_a = controls_b
+                continue
+            acks, unhandled = [], []
+            try:
+                if recorded:
+                    # read current pose from Locator once and write it to all recorded seeds
+                    pose = readCurrentPoseFromLocator()
+                    if pose is None or pose["localization_state"] < 2:
+                        logging.warning(f"NOT_LOCALIZED, seeds {recorded} not recorded")
+                        unhandled += [(i, "recordSeed") for i in recorded]
+                    else:
+                        logging.info(pose)
+                        blockmap.write_poses(
+                            client, recorded, pose["x"], pose["y"], pose["yaw"]
+                        )
+                        acks += [(i, "recordSeed") for i in recorded]
+                        logging.info(f"Seeds {recorded} recorded.")
+                seeds = blockmap.read_seeds(client, to_set) if to_set else {}
+                for i in to_set:
+                    x, y, a, enforce, uncertain = seeds[i]
+                    try:
+                        ok = setSeed(
+                            x=x, y=y, a=a, enforceSeed=enforce, uncertainSeed=uncertain
+                        )
+                    except RpcError as e:
+                        logging.warning(e)
+                        ok = False
+                    if not ok:
+                        logging.warning(f"Setting seed {i} failed.")
+                        unhandled.append((i, "setSeed"))
+                        continue
+                    logging.info(f"Seed {i} set.")
+                    acks.append((i, "setSeed"))
+                blockmap.clear_flags(client, acks)
+            except S7_ERRORS as e:
+                # the flags stay set and rise again against the last flags
+                logging.warning(f"{e}, connecting again")
+                client.disconnect()
+                continue
+            logging.info(
+                f"{len(acks)} of {len(recorded) + len(to_set)} edges handled in one cycle"
+            )
+            # unhandled edges are rising edges again in the next cycle
+            controls_a = blockmap.cleared(controls_b, unhandled)
+    finally:
+        # run() is started again with a new client by __main__
+        client.disconnect()
 
 
 def cancel(received_signal):
@@ -260,17 +215,19 @@ def recordSeed(station: int):
 
 
 def setSeed(x, y, a, enforceSeed, uncertainSeed):
-    sessionId = sessionLogin()
-    logging.info(sessionId)
-    clientLocalizationSetSeed(
-        sessionId=sessionId,
+    global rpc
+    if rpc is None:
+        rpc = LocatorRpcClient(URL, user_name, password)
+    logging.info(f"x={x}, y={y}, a={a}")
+    ok = rpc.set_seed(
         x=x,
         y=y,
         a=a,
         enforceSeed=enforceSeed,
         uncertainSeed=uncertainSeed,
     )
-    sessionLogout(sessionId)
+    logging.debug(f"JSON RPC latency {rpc.metrics.summary()}")
+    return ok
 
 
 if __name__ == "__main__":
@@ -8,18 +8,17 @@
 # https://realpython.com/intro-to-python-threading/#producer-consumer-using-lock
 
 import socket
-import struct
 import argparse
-from datetime import datetime
 import time
 import logging
-import requests
 import sqlite3
 import json
+import signal
 import concurrent.futures
-
-# import threading
-
+import threading
+from locator_pose import PoseStreamReader, LatestPose, PoseDeadband
+from locator_rpc import LocatorRpcClient, RpcError
+from seed_store import SeedStore, PoseSlots, LastPoseBuffer
 
 # Locator
 config = {
@@ -28,243 +27,195 @@ config = {
     "locator_host": "127.0.0.1",
     "locator_pose_port": 9011,
     "locator_json_rpc_port": 8080,
+    "seed0_deadband_xy": 0.005,  # meter
+    "seed0_deadband_yaw": 0.0087,  # radian, 0.5 degrees
+    "seed0_min_interval": 0.1,  # second
+    "seed0_max_interval": 10.0,  # second, heartbeat
+    "db_file": "locator.db",
+    "db_synchronous": "NORMAL",  # OFF, NORMAL, FULL or EXTRA, see seed_store.py
+    # second, probe of PRAGMA data_version after a change, doubled while nothing
+    # changes up to db_poll_max_interval
+    "db_poll_interval": 0.01,
+    "db_poll_max_interval": 0.1,
+    # second, buffer the last pose and write it to last_pose_slot_file at this
+    # interval, see LastPoseBuffer; 0: commit every due last pose to the
+    # database, up to 1/seed0_min_interval per second
+    "last_pose_flush_interval": 5.0,
+    "last_pose_stop_time": 2.0,  # second without movement to flush to the database
+    "last_pose_slot_file": "last_pose.slot",
 }
 
-# ClientLocalizationPoseDatagram data structure (see API manual)
-unpacker = struct.Struct("<ddQiQQddddddddddddddQddd")
 # print(datetime.now())
 
-id = 0
-pose = {}
+latest_pose = LatestPose()
+stopping = threading.Event()
 
 
 def get_client_localization_pose():
-    """Receive localization poses from ROKIT Locator and save them to a global variable, pose"""
-    global pose
-    # Creating a TCP/IP socket
-    client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    # Connect to the server
-    server_address = (config["locator_host"], config["locator_pose_port"])
-    client_sock.connect(server_address)
-    logging.info(
-        f"Connected to {config['locator_host']} on port {config['locator_pose_port']}"
-    )
-
-    try:
-        while True:
-            # read the socket
-            data = client_sock.recv(unpacker.size)
-            # upack the data (= interpret the datagram)
-            if not data:
-                continue
-            unpacked_data = unpacker.unpack(data)
-
-            # create a json row
-            pose = {
-                "timestamp": datetime.fromtimestamp(unpacked_data[1]).strftime(
-                    "%d-%m-%Y-%H-%M-%S"
-                ),
-                "x": unpacked_data[6],
-                "y": unpacked_data[7],
-                # 'yaw': math.degrees(unpacked_data[8]),
-                "yaw": unpacked_data[8],
-                "localization_state": unpacked_data[3],
-            }
-            # logging.debug(pose)
-    finally:
-        client_sock.close()
-
-
-def clientLocalizationSetSeed(
-    sessionId: str,
-    x: float,
-    y: float,
-    a: float,
-    enforceSeed: bool = False,
-    uncertainSeed: bool = False,
-):
-    global id
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "clientLocalizationSetSeed",
-        "params": {
-            "query": {
-                "sessionId": sessionId,
-                "enforceSeed": enforceSeed,
-                "uncertainSeed": uncertainSeed,
-                "seedPose": {"x": x, "y": y, "a": a},
-            }
-        },
-    }
-    id = id + 1
-    logging.debug(payload)
-
-    logging.info(f"x={x}, y={y}, a={a}")
-    response = requests.post(url=url, json=payload)
-    # print(response.json())
-
-
-def sessionLogin() -> str:
-    global id
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "sessionLogin",
-        "params": {
-            "query": {
-                "timeout": {  # timeout, not timestamp
-                    "valid": True,
-                    "time": 60,  # Integer64
-                    "resolution": 1,  # real_time = time / resolution
-                },
-                "userName": config["user_name"],
-                "password": config["password"],
-            }
-        },
-    }
-    id = id + 1
-    logging.debug(payload)
-
-    response = requests.post(url=url, json=payload)
-    logging.debug(response.json())
-    sessionId = response.json()["result"]["response"]["sessionId"]
-
-    return sessionId
-
-
-def sessionLogout(sessionId: str = None):
-    global id
-    # headers = {
-    #     "Content-Type": "application/json; charset=utf-8",
-    # }
-
-    payload = {
-        "id": id,
-        "jsonrpc": "2.0",
-        "method": "sessionLogout",
-        "params": {"query": {"sessionId": sessionId}},
-    }
-    id = id + 1
-
-    response = requests.post(url=url, json=payload)
-    logging.debug(response.json())
+    """Receive localization poses from ROKIT Locator and publish them to latest_pose.
 
-
-def update_seed_1():
-    """Update the first seed in table seeds of locator.db"""
-    global pose
-    # Connect to the database
-    connection = sqlite3.connect("locator.db")
-    # Create a cursor object
-    cursor = connection.cursor()
-
-    try:
-        while True:
-            if "localization_state" in pose and pose["localization_state"] >= 2:
-                pose_a = pose
-                # Define the update query
-                query = "UPDATE seeds SET x = ?, y=?, yaw=? WHERE id =1"
-                # Define the values to update and the condition
-                values = (pose_a["x"], pose_a["y"], pose_a["yaw"])
-                # Execute the query
-                cursor.execute(query, values)
-                # Commit the changes
-                connection.commit()
-                logging.debug(f"last pose updated to {values}")
-                break
-            else:
-                time.sleep(0.5)
-                continue
-
-        while True:
-            time.sleep(0.5)
-            if "localization_state" in pose and pose["localization_state"] >= 2:
-                pose_b = pose
-                # update last pose on the first row of table seeds
-                # units: meter and radian, 0.0087 radians = 0.5 degrees
-                if (
-                    abs(pose_b["x"] - pose_a["x"]) > 0.005
-                    or abs(pose_b["y"] - pose_a["y"]) > 0.005
-                    or abs(pose_b["yaw"] - pose_a["yaw"]) > 0.0087
-                ):
-                    # Define the update query
-                    query = "UPDATE seeds SET x = ?, y=?, yaw=? WHERE id =1"
-                    # Define the values to update and the condition
-                    values = (pose_b["x"], pose_b["y"], pose_b["yaw"])
-                    # Execute the query
-                    cursor.execute(query, values)
-                    # Commit the changes
-                    connection.commit()
-                    logging.debug(f"seed 1 updated to {values}")
-
-                    pose_a = pose_b
-    finally:
-        cursor.close()
-        connection.close()
+    When Locator closes the stream or cannot be reached, the error is logged
+    and the connection opened again after a backoff of 1 s up to 30 s.
+    """
+    server_address = (config["locator_host"], config["locator_pose_port"])
+    reader = PoseStreamReader()
+    backoff = 1.0
+    while not stopping.is_set():
+        # Creating a TCP/IP socket
+        client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client_sock.settimeout(1.0)  # to notice stopping while no pose comes
+        try:
+            client_sock.connect(server_address)
+            logging.info(
+                f"Connected to {config['locator_host']} on port {config['locator_pose_port']}"
+            )
+            reader.reset()
+            while not stopping.is_set():
+                try:
+                    # read the socket, one whole datagram at a time
+                    for offset in reader.read_frames(client_sock):
+                        # upack the data (= interpret the datagram)
+                        pose = latest_pose.publish(reader.unpack(offset))
+                        # logging.debug(pose)
+                        backoff = 1.0
+                        if stopping.is_set():
+                            break
+                except socket.timeout:
+                    continue
+        except (ConnectionError, OSError) as e:
+            logging.warning(f"Pose stream: {e!r}, connecting again in {backoff} s")
+            stopping.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+        finally:
+            client_sock.close()
+
+
+def update_seed_1(deadband):
+    """Update seed 1, the last pose, in table last_pose of locator.db.
+
+    The writer wakes on every new pose and writes it when it is outside the
+    deadband, limited by deadband.min_interval and deadband.max_interval.
+    """
+    seq = 0
+    while not stopping.is_set():
+        pose_b = deadband.next_pose(latest_pose, seq)
+        if pose_b is None:
+            continue
+        seq = pose_b.seq
+        # by the store's writer, coalesced with the next transaction
+        store.set_last_pose(pose_b.x, pose_b.y, pose_b.yaw)
+        deadband.mark_written(pose_b, time.monotonic())
+        logging.debug(f"seed 1 updated to {(pose_b.x, pose_b.y, pose_b.yaw)}")
+
+
+def buffer_seed_1(buffer):
+    """Pass every pose to buffer, which persists the last pose at a bounded rate"""
+    seq = 0
+    while not stopping.is_set():
+        pose = latest_pose.wait_newer(seq, timeout=0.5)
+        if pose is not None:
+            seq = pose.seq
+        buffer.update(pose, time.monotonic())
+
+
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
 
 
 def teach_or_set_seed():
-    global pose
-    # Connect to the database
-    connection = sqlite3.connect("locator.db")
-    # Create a cursor object
-    cursor = connection.cursor()
-    # Retrieve the data
-    seeds_a = cursor.execute("SELECT * FROM seeds").fetchall()
-
-    try:
-        while True:
-            time.sleep(0.5)
-
-            seeds_b = cursor.execute("SELECT * FROM seeds").fetchall()
-
-            for i in range(len(seeds_b)):
-                # teach seed
-                if not seeds_a[i][7] and seeds_b[i][7]:
-                    # read current pose from Locator and write it to pose i in the data block
-                    # pose = get_client_localization_pose()
-                    assert pose["localization_state"] >= 2, "NOT_LOCALIZED"
-
-                    # Define the update query
-                    query = "UPDATE seeds SET x = ?, y=?, yaw=?, teach=? WHERE id =?"
-                    # Define the values to update and the condition
-                    values = (pose["x"], pose["y"], pose["yaw"], 0, i + 1)
-                    # Execute the query
-                    cursor.execute(query, values)
-                    # Commit the changes
-                    connection.commit()
-
-                    logging.info(
-                        f"Seed taught, id {seeds_b[i][0]}, name {seeds_b[i][1]}, {values[:3]}"
-                    )
-                    break
-
-                # set seed
-                if not seeds_a[i][8] and seeds_b[i][8]:
-                    session_id = sessionLogin()
-                    clientLocalizationSetSeed(
-                        sessionId=session_id,
-                        x=seeds_b[i][2],
-                        y=seeds_b[i][3],
-                        a=seeds_b[i][4],
-                        enforceSeed=bool(seeds_b[i][5]),
-                        uncertainSeed=bool(seeds_b[i][6]),
-                    )
-                    sessionLogout(session_id)
-                    # reset field set in DB table seeds
-                    cursor.execute("UPDATE seeds SET 'set'=? WHERE id=?", (0, i + 1))
-
-                    # Commit the changes
-                    connection.commit()
-                    logging.info(
-                        f"Seed set, id {seeds_b[i][0]}, name {seeds_b[i][1]}, x={seeds_b[i][2]}, y={seeds_b[i][3]}, yaw={seeds_b[i][4]}"
-                    )
-                    break
-            seeds_a = seeds_b
-    finally:
-        cursor.close()
-        connection.close()
+    """Handle teach/set requests queued in seed_events by the database triggers.
+
+    The queue is only read when PRAGMA data_version says something was
+    committed; while nothing is, the probe backs off from db_poll_interval to
+    db_poll_max_interval. A request is handled if its flag is still set in the row; the
+    flag is cleared and the consumed events are deleted in one transaction.
+    """
+    for flag in ("teach", "set"):
+        ids = store.flagged(flag)
+        if ids:
+            logging.info(f"{flag} already requested for seeds {ids}")
+    # requests queued while the bridge was down are handled first
+    last_event = 0
+    pending = []  # (seed id, flag) not handled yet, retried
+    retry_at = 0.0
+    interval = config["db_poll_interval"]
+    while not stopping.is_set():
+        time.sleep(interval)
+        retry = pending and time.monotonic() >= retry_at
+        if not store.changed() and not retry:
+            interval = min(interval * 2, config["db_poll_max_interval"])
+            continue
+        interval = config["db_poll_interval"]
+        events = store.events(last_event)
+        if not events and not retry:
+            continue
+        requests = list(pending)
+        for event_id, seed_id, flag in events:
+            if (seed_id, flag) not in requests:
+                requests.append((seed_id, flag))
+        if events:
+            last_event = events[-1][0]
+        rows = store.seed_rows({seed_id for seed_id, _ in requests})
+        # requests withdrawn meanwhile, flag cleared or row deleted, are dropped
+        taught = [
+            i for i, flag in requests if flag == "teach" and rows.get(i, [0] * 9)[7]
+        ]
+        to_set = [
+            i for i, flag in requests if flag == "set" and rows.get(i, [0] * 9)[8]
+        ]
+        updates = [("DELETE FROM seed_events WHERE id <= ?", (last_event,))]
+        unhandled = []
+        handled = 0
+        # teach seeds, all with the same current pose from Locator
+        pose = latest_pose.latest
+        if taught and (pose is None or not pose.is_localized()):
+            logging.warning(f"NOT_LOCALIZED, seeds {taught} not taught")
+            unhandled += [(i, "teach") for i in taught]
+        elif taught:
+            for i in taught:
+                updates += store.teach_statements(i, pose.x, pose.y, pose.yaw)
+                handled += 1
+                logging.info(
+                    f"Seed taught, id {i}, name {rows[i][1]}, x={pose.x}, y={pose.y}, yaw={pose.yaw}"
+                )
+        # set seeds
+        for i in to_set:
+            row = rows[i]
+            try:
+                ok = rpc.set_seed(
+                    x=row[2],
+                    y=row[3],
+                    a=row[4],
+                    enforceSeed=bool(row[5]),
+                    uncertainSeed=bool(row[6]),
+                )
+            except RpcError as e:
+                logging.warning(e)
+                ok = False
+            if not ok:
+                logging.warning(f"Setting seed {i} failed.")
+                unhandled.append((i, "set"))
+                continue
+            # reset field setSeed in DB table seeds
+            updates += store.set_statements(i)
+            handled += 1
+            logging.info(
+                f"Seed set, id {i}, name {row[1]}, x={row[2]}, y={row[3]}, yaw={row[4]}"
+            )
+        # all edges of this cycle and the consumed events in one transaction
+        try:
+            store.write(updates).result()
+        except sqlite3.Error as e:
+            logging.warning(f"{e}, seeds {taught} and {to_set} are retried")
+            handled = 0
+            unhandled = [(i, "teach") for i in taught] + [(i, "set") for i in to_set]
+        if taught or to_set:
+            logging.info(
+                f"{handled} of {len(taught) + len(to_set)} edges handled in one cycle"
+            )
+        # unhandled requests are retried while their flag stays set
+        pending = unhandled
+        retry_at = time.monotonic() + 0.5
 
 
 if __name__ == "__main__":
@@ -323,23 +274,47 @@ if __name__ == "__main__":
     url = (
         "http://" + config["locator_host"] + ":" + str(config["locator_json_rpc_port"])
     )
+    rpc = LocatorRpcClient(url, config["user_name"], config["password"])
 
     # format = "%(asctime)s [%(levelname)s] %(threadName)s %(message)s"
     format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
     logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%Y-%m-%d %H:%M:%S")
 
+    store = SeedStore(config["db_file"], config["db_synchronous"])
+    buffer = None
+    if config["last_pose_flush_interval"] > 0:
+        slots = PoseSlots(config["last_pose_slot_file"])
+        store.recover_last_pose(slots)
+        buffer = LastPoseBuffer(
+            store,
+            slots,
+            PoseDeadband.from_config(config),
+            config["last_pose_flush_interval"],
+            config["last_pose_stop_time"],
+        )
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
     # x = threading.Thread(target=get_client_localization_pose, daemon=True)
     # logging.info("start thread get_client_localization_pose")
     # x.start()
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
         executor.submit(get_client_localization_pose)
-        executor.submit(update_seed_1)
+        if buffer is None:
+            executor.submit(update_seed_1, PoseDeadband.from_config(config))
+        else:
+            executor.submit(buffer_seed_1, buffer)
         executor.submit(teach_or_set_seed)
         try:
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
             print("Main thread received KeyboardInterrupt")
+            stopping.set()
+            # before the threads finish, update_seed_1 may wait up to seed0_max_interval
             executor.shutdown(wait=True)
+            # the last pose is flushed once buffer_seed_1 cannot update it any more
+            if buffer is not None:
+                buffer.close()
+            store.close()
             print("All threads completed")
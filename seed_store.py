@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Storage layer of seed_sqlite.py: table seeds of locator.db in WAL mode, with
+# one writer thread for all writes of the bridge and a separate read connection.
+#
+# In WAL mode readers never block the writer and the writer never blocks
+# readers, so the bridge, an HMI editing the teach/set columns and dbeaver can
+# work on the file at the same time; only writers still take turns. WAL needs
+# all processes on the same host, not on a network file system.
+
+import logging
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+SYNCHRONOUS = ("OFF", "NORMAL", "FULL", "EXTRA")
+SCHEMA_VERSION = 1  # PRAGMA user_version of the current schema
+LAST_POSE_SQL = "REPLACE INTO last_pose (id, x, y, yaw, updated) VALUES (1, ?, ?, ?, ?)"
+# sequence number, x, y, yaw, time (epoch seconds), CRC-32 of the fields before
+_slot = struct.Struct("<QddddI")
+SLOT_SIZE = 64
+# names of the teach/set columns, older databases use "teach" and "set"
+FLAG_COLUMNS = {"teach": "teachSeed", "set": "setSeed"}
+LEGACY_FLAG_COLUMNS = {"teach": "teach", "set": "set"}
+
+
+class SchemaError(Exception):
+    """The database has a schema this version cannot work with"""
+
+
+def flag_columns(connection) -> dict:
+    """Names of the teach/set columns of table seeds"""
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(seeds)")]
+    if "teach" in columns and "set" in columns:
+        return dict(LEGACY_FLAG_COLUMNS)
+    return dict(FLAG_COLUMNS)
+
+
+def events_ddl(columns: dict = FLAG_COLUMNS) -> list:
+    """Queue table seed_events and the triggers filling it.
+
+    Every change of a teach/set column from 0 to 1, by any program, queues an
+    event. AUTOINCREMENT keeps ids growing after consumed events are deleted,
+    so a consumer can remember the last id it has seen.
+    """
+    ddl = ["""CREATE TABLE IF NOT EXISTS seed_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seed_id INTEGER NOT NULL,
+            flag TEXT NOT NULL,
+            created REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )"""]
+    for flag, column in columns.items():
+        ddl += [
+            f"""CREATE TRIGGER IF NOT EXISTS seed_events_{flag}_update
+            AFTER UPDATE OF "{column}" ON seeds
+            WHEN NEW."{column}" AND NOT coalesce(OLD."{column}", 0)
+            BEGIN
+                INSERT INTO seed_events (seed_id, flag) VALUES (NEW.id, '{flag}');
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS seed_events_{flag}_insert
+            AFTER INSERT ON seeds
+            WHEN NEW."{column}"
+            BEGIN
+                INSERT INTO seed_events (seed_id, flag) VALUES (NEW.id, '{flag}');
+            END""",
+        ]
+    return ddl
+
+
+def _migrate_1(connection):
+    """Rebuild seeds with id as INTEGER PRIMARY KEY and no other full index.
+
+    Partial indexes cover only the rows with a pending teach/set request, the
+    last pose moves to the one-row table last_pose, and seed_events with its
+    triggers is created. The names of the teach/set columns are kept, as
+    other programs write them.
+    """
+    columns = flag_columns(connection)
+    teach, set_ = columns["teach"], columns["set"]
+    exists = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seeds'"
+    ).fetchone()
+    connection.execute("DROP TABLE IF EXISTS seeds_new")
+    connection.execute(f"""CREATE TABLE seeds_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            x REAL,
+            y REAL,
+            yaw REAL,
+            enforceSeed INTEGER DEFAULT 1,
+            uncertainSeed INTEGER DEFAULT 0,
+            "{teach}" INTEGER DEFAULT 0,
+            "{set_}" INTEGER DEFAULT 0
+        )""")
+    if exists:
+        # fails on duplicate ids instead of dropping rows
+        connection.execute(f"""INSERT INTO seeds_new
+            SELECT id, name, x, y, yaw, enforceSeed, uncertainSeed, "{teach}", "{set_}"
+            FROM seeds ORDER BY rowid""")
+        # with its indexes and triggers
+        connection.execute("DROP TABLE seeds")
+    connection.execute("ALTER TABLE seeds_new RENAME TO seeds")
+    connection.execute(f'CREATE INDEX seeds_teach ON seeds (id) WHERE "{teach}" = 1')
+    connection.execute(f'CREATE INDEX seeds_set ON seeds (id) WHERE "{set_}" = 1')
+    connection.execute("""CREATE TABLE IF NOT EXISTS last_pose (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            x REAL,
+            y REAL,
+            yaw REAL,
+            updated REAL
+        )""")
+    connection.execute("""INSERT OR IGNORE INTO last_pose (id, x, y, yaw)
+        SELECT id, x, y, yaw FROM seeds WHERE id = 1""")
+    for sql in events_ddl(columns):
+        connection.execute(sql)
+
+
+# MIGRATIONS[k] upgrades a database from user_version k to k + 1
+MIGRATIONS = [_migrate_1]
+
+
+def migrate(connection) -> int:
+    """Upgrade the schema to SCHEMA_VERSION in one transaction.
+
+    Returns the version found. The connection must be in autocommit mode.
+    """
+    # do not check views of other programs while seeds is being replaced
+    connection.execute("PRAGMA legacy_alter_table = ON")
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise SchemaError(
+                f"schema version {version} is newer than {SCHEMA_VERSION}, update the bridge"
+            )
+        for k in range(version, SCHEMA_VERSION):
+            MIGRATIONS[k](connection)
+            logging.info(f"schema migrated from version {k} to {k + 1}")
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.execute("PRAGMA legacy_alter_table = OFF")
+    return version
+
+
+_STOP = object()
+_WAKE = object()
+
+
+class SeedStore:
+    """Table seeds of a SQLite database shared with other programs.
+
+    write() queues statements for the writer thread, which commits everything
+    queued at that moment in one transaction (group commit): under load many
+    requests share one fsync, otherwise a request is committed right away.
+    set_last_pose() is coalesced, only the newest pose queued since the last
+    transaction is written. read() runs on its own connection and sees the
+    last committed state without waiting for the writer.
+
+    Teach/set requests are read from the queue table seed_events (see
+    events_ddl()) instead of diffing the whole table: changed() probes PRAGMA
+    data_version, which only moves when another connection committed, and
+    events() returns the events after the last one consumed.
+
+    The schema is migrated to SCHEMA_VERSION when the store is opened. Rows
+    are always addressed by id; the pose of seed 1 lives in table last_pose.
+
+    synchronous=NORMAL syncs the WAL at checkpoints only: the database stays
+    consistent on power loss, but the last transactions may be lost. FULL
+    syncs every commit.
+    """
+
+    def __init__(
+        self,
+        path: str = "locator.db",
+        synchronous: str = "NORMAL",
+        busy_timeout: float = 5.0,
+        max_batch: int = 256,
+    ):
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS}")
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.max_batch = max_batch
+        self.stats = {"transactions": 0, "statements": 0, "errors": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._last_pose = None
+        self._reader = self._connect()
+        # persistent in the database file, once set for every connection
+        mode = self._reader.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode != "wal":
+            logging.warning(f"{path} stays in journal mode {mode}, not WAL")
+        version = migrate(self._reader)
+        if version != SCHEMA_VERSION:
+            logging.info(f"{path} upgraded from schema version {version}")
+        self.columns = flag_columns(self._reader)
+        self._read_lock = threading.Lock()
+        self._data_version = None
+        self._writer = threading.Thread(
+            target=self._write_loop, name="seed_store_writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self):
+        # autocommit, the writer opens its transactions itself
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        return connection
+
+    # reading
+
+    def read(self, sql: str, params=()) -> list:
+        """Rows of a query on the read connection"""
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def changed(self) -> bool:
+        """Whether anything was committed since the last call; no table is read"""
+        with self._read_lock:
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+        changed, self._data_version = version != self._data_version, version
+        return changed
+
+    def seed_rows(self, ids) -> dict:
+        """{id: (id, name, x, y, yaw, enforceSeed, uncertainSeed, teach, set)}
+        of the rows with these ids; seed 1 with the pose of last_pose"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        teach, set_ = self.columns["teach"], self.columns["set"]
+        rows = self.read(
+            f"""SELECT id, name, x, y, yaw, enforceSeed, uncertainSeed, "{teach}", "{set_}"
+            FROM seeds WHERE id IN ({placeholders})""",
+            ids,
+        )
+        rows = {row[0]: row for row in rows}
+        if 1 in rows:
+            last_pose = self.last_pose()
+            if last_pose is not None:
+                rows[1] = rows[1][:2] + last_pose + rows[1][5:]
+        return rows
+
+    def last_pose(self):
+        """(x, y, yaw) of table last_pose, None if there is none"""
+        rows = self.read("SELECT x, y, yaw FROM last_pose WHERE id = 1")
+        return rows[0] if rows and rows[0][0] is not None else None
+
+    def flagged(self, flag: str) -> list:
+        """Ids of the rows with teach or set equal to 1, by the partial index"""
+        column = self.columns[flag]
+        return [
+            row[0] for row in self.read(f'SELECT id FROM seeds WHERE "{column}" = 1')
+        ]
+
+    def recover_last_pose(self, slots) -> bool:
+        """Copy the pose of the slot file to last_pose if it is newer.
+
+        After a crash the slot file may hold a pose that was never flushed to
+        the database.
+        """
+        record = slots.read()
+        if record is None:
+            return False
+        seq, x, y, yaw, updated = record
+        rows = self.read("SELECT updated FROM last_pose WHERE id = 1")
+        if rows and rows[0][0] is not None and rows[0][0] >= updated:
+            return False
+        self.write([(LAST_POSE_SQL, (x, y, yaw, updated))]).result()
+        logging.info(f"last pose x={x}, y={y}, yaw={yaw} recovered from {slots.path}")
+        return True
+
+    def events(self, after: int = 0) -> list:
+        """(id, seed_id, flag) of the queued events with an id above after"""
+        return self.read(
+            "SELECT id, seed_id, flag FROM seed_events WHERE id > ? ORDER BY id",
+            (after,),
+        )
+
+    # writing
+
+    def teach_statements(self, i: int, x: float, y: float, yaw: float) -> list:
+        """Statements storing the pose of seed i and clearing its teach flag"""
+        statements = [
+            (
+                f'UPDATE seeds SET x=?, y=?, yaw=?, "{self.columns["teach"]}"=0 WHERE id=?',
+                (x, y, yaw, i),
+            )
+        ]
+        if i == 1:
+            statements.append((LAST_POSE_SQL, (x, y, yaw, time.time())))
+        return statements
+
+    def set_statements(self, i: int) -> list:
+        """Statements clearing the set flag of seed i"""
+        return [(f'UPDATE seeds SET "{self.columns["set"]}"=0 WHERE id=?', (i,))]
+
+    def write(self, statements) -> Future:
+        """Queue [(sql, params), ...] to be run in one transaction.
+
+        The future is resolved when the transaction is committed, or gets the
+        sqlite3.Error that rolled it back.
+        """
+        future = Future()
+        self._queue.put((list(statements), future))
+        return future
+
+    def set_last_pose(self, x: float, y: float, yaw: float):
+        """Write the last pose to last_pose with the next transaction, without waiting"""
+        with self._lock:
+            pending = self._last_pose is not None
+            self._last_pose = (x, y, yaw, time.time())
+        if not pending:
+            self._queue.put(_WAKE)
+
+    def close(self):
+        """Commit what is queued, then stop the writer and close the connections"""
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._reader.close()
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                items = [self._queue.get()]
+                while len(items) < self.max_batch:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                jobs = [item for item in items if isinstance(item, tuple)]
+                with self._lock:
+                    last_pose, self._last_pose = self._last_pose, None
+                if jobs or last_pose is not None:
+                    self._commit(connection, jobs, last_pose)
+                if _STOP in items:
+                    return
+        finally:
+            connection.close()
+
+    def _commit(self, connection, jobs: list, last_pose):
+        statements = [statement for job, _ in jobs for statement in job]
+        if last_pose is not None:
+            statements.append((LAST_POSE_SQL, last_pose))
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for sql, params in statements:
+                connection.execute(sql, params)
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            self.stats["errors"] += 1
+            logging.warning(f"transaction of {len(statements)} statements failed, {e}")
+            with self._lock:
+                # retried with the next transaction unless a newer pose came
+                if last_pose is not None and self._last_pose is None:
+                    self._last_pose = last_pose
+                    self._queue.put(_WAKE)
+            for _, future in jobs:
+                future.set_exception(e)
+            time.sleep(1)  # do not spin on a read-only or corrupt file
+            return
+        self.stats["transactions"] += 1
+        self.stats["statements"] += len(statements)
+        for _, future in jobs:
+            future.set_result(None)
+
+
+class PoseSlots:
+    """Crash-consistent record of the last pose in a file of two 64-byte slots.
+
+    Writes alternate between the slots, each with a sequence number and a
+    CRC-32, so a write torn by a crash or power loss leaves the other slot
+    intact. read() returns the valid slot with the higher sequence number.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self._file = open(path, mode, buffering=0)
+        record = self.read()
+        self.seq = record[0] if record else 0
+
+    def read(self):
+        """(seq, x, y, yaw, time) of the newest valid slot, None if there is none"""
+        self._file.seek(0)
+        data = self._file.read(2 * SLOT_SIZE)
+        records = []
+        for offset in (0, SLOT_SIZE):
+            chunk = data[offset : offset + _slot.size]
+            if len(chunk) < _slot.size:
+                continue
+            *values, crc = _slot.unpack(chunk)
+            if values[0] and crc == zlib.crc32(chunk[:-4]):
+                records.append(tuple(values))
+        return max(records) if records else None
+
+    def write(self, x: float, y: float, yaw: float, updated: float):
+        self.seq += 1
+        data = _slot.pack(self.seq, x, y, yaw, updated, 0)[:-4]
+        self._file.seek(self.seq % 2 * SLOT_SIZE)
+        self._file.write(data + struct.pack("<I", zlib.crc32(data)))
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self._file.fileno())
+        else:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class LastPoseBuffer:
+    """Last pose kept in memory and persisted at a bounded rate.
+
+    update() takes every new pose, or None when none came. A localized pose
+    outside the deadband of the buffered one replaces it in memory. The
+    buffered pose is written to the slot file at most every flush_interval
+    seconds, and to the slot file and table last_pose when the vehicle stops
+    (no move beyond the deadband for stop_time seconds), when localization is
+    lost, and by close(). After a crash the recovered pose is at most
+    flush_interval seconds old.
+    """
+
+    def __init__(
+        self,
+        store: SeedStore,
+        slots: PoseSlots,
+        deadband,
+        flush_interval: float = 5.0,
+        stop_time: float = 2.0,
+    ):
+        self.store = store
+        self.slots = slots
+        self.deadband = deadband
+        self.flush_interval = flush_interval
+        self.stop_time = stop_time
+        self.pose = None  # buffered
+        self.moved_at = 0.0
+        self.stopped = True
+        self.localized = False
+        self.flushed_at = -float("inf")
+        self._slot_pose = None  # last written to the slot file
+        self._db_pose = None  # last written to last_pose
+        self._lock = threading.Lock()
+
+    def update(self, pose, now: float):
+        with self._lock:
+            if pose is not None and pose.is_localized():
+                self.localized = True
+                if self.deadband.moved(pose):
+                    self.deadband.mark_written(pose, now)
+                    self.pose = pose
+                    self.moved_at = now
+                    self.stopped = False
+            elif pose is not None and self.localized:
+                self.localized = False
+                self._flush(now, "localization lost")
+                return
+            if self.pose is None:
+                return
+            if not self.stopped and now - self.moved_at >= self.stop_time:
+                self.stopped = True
+                self._flush(now, "stopped")
+            elif now - self.flushed_at >= self.flush_interval:
+                self._flush(now)
+
+    def _flush(self, now: float, event: str = None):
+        pose = self.pose
+        if pose is None:
+            return
+        self.flushed_at = now
+        if pose is not self._slot_pose:
+            self.slots.write(pose.x, pose.y, pose.yaw, time.time())
+            self._slot_pose = pose
+        if event is not None and pose is not self._db_pose:
+            self.store.set_last_pose(pose.x, pose.y, pose.yaw)
+            self._db_pose = pose
+            logging.info(f"{event}, last pose x={pose.x}, y={pose.y}, yaw={pose.yaw}")
+
+    def close(self):
+        """Write the buffered pose to the slot file and last_pose"""
+        with self._lock:
+            self._flush(time.monotonic(), "shutdown")
+            self.slots.close()
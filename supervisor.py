@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Run the Modbus bridges of many vehicles in one process and one event loop.
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import signal
+import time
+
+import aiohttp
+
+import seed_modbus
+from modbus_map import POSE_REGISTERS
+from seed_modbus_async import ModbusBridge
+
+
+def register_ranges(config: dict) -> list:
+    """[start, end) of the flag bits and of the poses of a vehicle's seeds"""
+    seed_num = config["seed_num"]
+    bits, poses = config["bits_starting_addr"], config["poses_starting_addr"]
+    return [
+        (bits, bits + math.ceil(seed_num * 4 / 16)),
+        (poses, poses + seed_num * POSE_REGISTERS),
+    ]
+
+
+def load_vehicles(path: str) -> list:
+    """Load a list of vehicle configurations.
+
+    Every item is either a dict with the schema of config.json or the path of
+    such a file, relative to the list file. An optional "name" identifies the
+    vehicle in logs, plc_host is used otherwise. Names must be unique, and no
+    two vehicles may poll and ack the same registers of one PLC.
+    """
+    with open(path, "r") as f:
+        items = json.load(f)
+    vehicles = []
+    for item in items:
+        config = dict(seed_modbus.config)
+        if isinstance(item, str):
+            with open(os.path.join(os.path.dirname(path), item), "r") as f:
+                config.update(json.load(f))
+        else:
+            config.update(item)
+        vehicles.append(config)
+    names, used = set(), {}  # used: (plc_host, plc_port): [(start, end, name)]
+    for config in vehicles:
+        name = config.get("name") or config["plc_host"]
+        if name in names:
+            raise ValueError(f"{path}: vehicle name {name} is not unique")
+        names.add(name)
+        plc = used.setdefault((config["plc_host"], config["plc_port"]), [])
+        for start, end in register_ranges(config):
+            for other_start, other_end, other in plc:
+                if start < other_end and other_start < end:
+                    raise ValueError(
+                        f"{path}: registers {start}-{end - 1} of {name} overlap "
+                        f"{other_start}-{other_end - 1} of {other} on {config['plc_host']}"
+                    )
+        plc += [(start, end, name) for start, end in register_ranges(config)]
+    return vehicles
+
+
+class Supervisor:
+    """Keep one ModbusBridge per vehicle running, restarting failed ones"""
+
+    def __init__(self, vehicles: list, report_interval: float = 60.0):
+        self.bridges = [
+            ModbusBridge(config, name=config.get("name")) for config in vehicles
+        ]
+        self.report_interval = report_interval
+        self.health = {
+            bridge.name: {"state": "starting", "restarts": 0} for bridge in self.bridges
+        }
+
+    async def _supervise(self, bridge: ModbusBridge, http: aiohttp.ClientSession):
+        """Run a bridge, a failure only restarts this vehicle"""
+        backoff = 1.0
+        while True:
+            health = self.health[bridge.name]
+            health["state"] = "running"
+            started = time.monotonic()
+            try:
+                await bridge.run(http)
+            except asyncio.CancelledError:
+                health["state"] = "stopped"
+                raise
+            except Exception as e:
+                logging.exception(f"{bridge.name}: bridge failed, {e!r}")
+                bridge.stats["last_error"] = repr(e)
+            health["state"] = "restarting"
+            health["restarts"] += 1
+            if time.monotonic() - started > 60:
+                backoff = 1.0
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def health_table(self) -> str:
+        header = f"{'vehicle':<20} {'state':<10} {'restarts':>8} {'poses/s':>8} {'seed0/s':>8} {'taught':>6} {'set':>6} {'errors':>6}  last error"
+        rows = [header]
+        now = time.monotonic()
+        elapsed = now - self._report_tic
+        for bridge in self.bridges:
+            stats = bridge.stats
+            last = self._last_stats.get(bridge.name, {})
+            poses = (stats["poses"] - last.get("poses", 0)) / elapsed
+            writes = (stats["seed0_writes"] - last.get("seed0_writes", 0)) / elapsed
+            health = self.health[bridge.name]
+            rows.append(
+                f"{bridge.name:<20} {health['state']:<10} {health['restarts']:>8} {poses:>8.1f} {writes:>8.2f} {stats['taught']:>6} {stats['set']:>6} {stats['errors']:>6}  {stats['last_error']}"
+            )
+            self._last_stats[bridge.name] = dict(stats)
+        self._report_tic = now
+        return "\n".join(rows)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logging.info("bridge health\n" + self.health_table())
+
+    async def run(self):
+        self._report_tic = time.monotonic()
+        self._last_stats = {}
+        async with aiohttp.ClientSession() as http:
+            await asyncio.gather(
+                self._report(),
+                *(self._supervise(bridge, http) for bridge in self.bridges),
+            )
+
+
+async def main(vehicles: list, report_interval: float):
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    await Supervisor(vehicles, report_interval).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="runs the seed bridges of many vehicles in one process",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "-v",
+        "--vehicles",
+        type=str,
+        required=True,
+        help="The path to a JSON list of vehicle configurations",
+    )
+    parser.add_argument(
+        "--report",
+        type=float,
+        default=60.0,
+        help="Interval in seconds of the health table in the log",
+    )
+    parser.add_argument(
+        "--debug",
+        type=int,
+        default=0,
+        help="0: logging.INFO, 1: logging.DEBUG",
+    )
+    args = parser.parse_args()
+
+    format = "%(asctime)s [%(levelname)s] %(funcName)s(), %(message)s"
+    logging.basicConfig(
+        format=format,
+        level=logging.DEBUG if args.debug else logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    vehicles = load_vehicles(args.vehicles)
+    logging.info(f"{len(vehicles)} vehicles: {[v.get('name') for v in vehicles]}")
+    try:
+        asyncio.run(main(vehicles, args.report))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logging.info("Supervisor stopped.")
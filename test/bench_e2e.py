@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# End-to-end benchmark of the bridges. Every bridge runs unmodified as a
+# subprocess against local stand-ins: replay.py for the pose port (a vehicle
+# driving a circle), mock_rpc.py for the JSON RPC port, and for the Modbus
+# bridges the pymodbus simulator of device_seed in cfg/modbus_slave.json;
+# seed_sqlite.py works on a temporary copy of locator.db.
+#
+# edge_to_ack  time from raising teachSeed/setSeed until the bridge cleared it
+# seed0_age    age of the pose in seed 0, sampled while the edges are raised;
+#              the pose is located on the known trajectory to find when it was
+#              sent
+# cpu          user and system seconds of the bridge process over its run
+#
+# Results are printed as JSON, for example to compare before and after a change.
+#
+# python test/bench_e2e.py --edges 40 --output bench.json
+
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mock_rpc import MockLocatorRpc  # noqa: E402
+from replay import ReplayServer, synthetic_frames  # noqa: E402
+from seed_codec import SET_SEED, TEACH_SEED, decode_pose, flag_position  # noqa: E402
+
+try:
+    from pymodbus.datastore import ModbusServerContext, ModbusSimulatorContext
+    from pymodbus.server import ModbusTcpServer
+except ImportError:  # only the Modbus bridges need the simulator
+    ModbusSimulatorContext = None
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BRIDGES = {
+    "seed_modbus": "seed_modbus.py",
+    "seed_modbus_async": "seed_modbus_async.py",
+    "seed_sqlite": "seed_sqlite.py",
+}
+RADIUS = 5.0  # meter, of the synthetic trajectory
+SPEED = 0.5  # meter per second
+PERIOD = math.tau * RADIUS / SPEED
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def pose_age(x: float, y: float, epoch: float, now: float) -> float:
+    """Seconds since replay sent the pose at (x, y) on the circle started at epoch"""
+    t = math.atan2(y, x) % math.tau * RADIUS / SPEED
+    return (now - epoch - t) % PERIOD
+
+
+def summarize(values: list) -> dict:
+    """Milliseconds statistics of a list of seconds"""
+    if not values:
+        return {"n": 0}
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(len(values) - 1, int(p / 100.0 * len(values)))] * 1000.0
+
+    return {
+        "n": len(values),
+        "mean_ms": sum(values) / len(values) * 1000.0,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": values[-1] * 1000.0,
+    }
+
+
+class StandIns:
+    """Pose port, JSON RPC port and Modbus simulator served by one event loop thread"""
+
+    def __init__(self, frq: float, rpc_latency: float, device: dict = None):
+        self.frq = frq
+        self.pose_port = free_port()
+        self.rpc_port = free_port()
+        self.plc_port = free_port()
+        self.epoch = None  # time the first pose was sent to the current client
+        self.replay = ReplayServer(self._frames)
+        self.rpc = MockLocatorRpc(latency=rpc_latency)
+        # the simulator consumes the device dictionary
+        self.store = (
+            ModbusSimulatorContext(copy.deepcopy(device), None) if device else None
+        )
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _frames(self):
+        self.epoch = time.time()
+        return synthetic_frames(self.frq, RADIUS, SPEED)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._start())
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _start(self):
+        self.rpc_runner = await self.rpc.start("127.0.0.1", self.rpc_port)
+        self.pose_server = await asyncio.start_server(
+            self.replay.play, "127.0.0.1", self.pose_port
+        )
+        self.modbus_server = None
+        if self.store is not None:
+            context = ModbusServerContext(slaves=self.store, single=True)
+            self.modbus_server = ModbusTcpServer(
+                context, address=("127.0.0.1", self.plc_port)
+            )
+            asyncio.ensure_future(self.modbus_server.serve_forever())
+
+    async def _stop(self):
+        self.pose_server.close()
+        await self.rpc_runner.cleanup()
+        if self.modbus_server is not None:
+            await self.modbus_server.shutdown()
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+
+class ModbusTarget:
+    """Raises flags and reads seed 0 in the simulator's registers"""
+
+    def __init__(self, store, config: dict):
+        self.store = store
+        self.config = config
+
+    def seeds(self) -> list:
+        return list(range(1, self.config["seed_num"]))
+
+    def raise_flag(self, i: int, flag: int):
+        register, mask = flag_position(i, flag)
+        address = self.config["bits_starting_addr"] + register
+        self.store.setValues(
+            6, address, [self.store.getValues(3, address, 1)[0] | mask]
+        )
+        return address, mask
+
+    def cleared(self, handle) -> bool:
+        address, mask = handle
+        return not self.store.getValues(3, address, 1)[0] & mask
+
+    def seed_0(self) -> tuple:
+        registers = self.store.getValues(3, self.config["poses_starting_addr"], 6)
+        x, y, _ = decode_pose(
+            registers, self.config["byte_order"], self.config["word_order"]
+        )
+        return x, y
+
+    def close(self):
+        pass
+
+
+class SqliteTarget:
+    """Raises flags and reads the last pose in the bridge's copy of locator.db"""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.lock = threading.Lock()
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(seeds)")
+        ]
+        self.columns = {
+            TEACH_SEED: "teachSeed" if "teachSeed" in columns else "teach",
+            SET_SEED: "setSeed" if "setSeed" in columns else "set",
+        }
+        # flags left set in the copy would never rise
+        self.connection.execute(
+            f'UPDATE seeds SET "{self.columns[TEACH_SEED]}"=0, "{self.columns[SET_SEED]}"=0'
+        )
+        self.connection.commit()
+
+    def seeds(self) -> list:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id FROM seeds ORDER BY id"
+            ).fetchall()
+        return [row[0] for row in rows if row[0] != 1]  # id 1 holds the last pose
+
+    def raise_flag(self, i: int, flag: int):
+        column = self.columns[flag]
+        with self.lock:
+            self.connection.execute(f'UPDATE seeds SET "{column}"=1 WHERE id=?', (i,))
+            self.connection.commit()
+        return column, i
+
+    def cleared(self, handle) -> bool:
+        column, i = handle
+        with self.lock:
+            row = self.connection.execute(
+                f'SELECT "{column}" FROM seeds WHERE id=?', (i,)
+            ).fetchone()
+        return not row[0]
+
+    def seed_0(self) -> tuple:
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    "SELECT x, y FROM last_pose WHERE id=1"
+                ).fetchone()
+            except sqlite3.OperationalError:  # not migrated by the bridge yet
+                row = None
+            if row is None or row[0] is None:
+                row = self.connection.execute(
+                    "SELECT x, y FROM seeds WHERE id=1"
+                ).fetchone()
+            return row
+
+    def close(self):
+        self.connection.close()
+
+
+def run_bridge(name: str, args, device: dict) -> dict:
+    result = {"bridge": name}
+    stand_ins = StandIns(
+        args.frq, args.rpc_latency, device if name != "seed_sqlite" else None
+    )
+    stand_ins.start()
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    config = dict(args.base_config)
+    config.update(
+        {
+            "locator_host": "127.0.0.1",
+            "locator_pose_port": stand_ins.pose_port,
+            "locator_json_rpc_port": stand_ins.rpc_port,
+            "plc_host": "127.0.0.1",
+            "plc_port": stand_ins.plc_port,
+            # the simulator refuses reads spanning its undefined registers
+            "max_read_gap": 0,
+            "debug": 0,
+        }
+    )
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+    if name == "seed_sqlite":
+        # seed 0 is read from table last_pose, so commit every due pose to it
+        config["last_pose_flush_interval"] = 0
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+        shutil.copy(os.path.join(REPO, "locator.db"), workdir)
+        target = SqliteTarget(os.path.join(workdir, "locator.db"))
+    else:
+        target = ModbusTarget(stand_ins.store, config)
+
+    log_path = os.path.join(workdir, "bridge.log")
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.monotonic()
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO, BRIDGES[name]), "-c", config_path],
+            cwd=workdir,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    try:
+        # ready once seed 0 follows the trajectory
+        ready = None
+        while time.monotonic() - started < args.timeout:
+            x, y = target.seed_0()
+            if stand_ins.epoch and abs(math.hypot(x, y) - RADIUS) < 0.01:
+                ready = time.monotonic() - started
+                break
+            time.sleep(0.05)
+        result["ready_s"] = ready
+        if ready is None:
+            raise TimeoutError("seed 0 was never written")
+
+        ages = []
+        sampling = threading.Event()
+
+        def sample():
+            while not sampling.wait(args.sample_interval):
+                x, y = target.seed_0()
+                ages.append(pose_age(x, y, stand_ins.epoch, time.time()))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+        rng = random.Random(args.seed)
+        seeds = target.seeds()
+        latencies = {TEACH_SEED: [], SET_SEED: []}
+        timeouts = 0
+        sets_before = len(stand_ins.rpc.seeds)
+        for k in range(args.edges):
+            flag = TEACH_SEED if k % 2 == 0 else SET_SEED
+            # uniform phase against the polling cycle of the bridge
+            time.sleep(rng.uniform(0.0, 0.5))
+            handle = target.raise_flag(seeds[k // 2 % len(seeds)], flag)
+            tic = time.perf_counter()
+            while not target.cleared(handle):
+                if time.perf_counter() - tic > args.timeout:
+                    timeouts += 1
+                    break
+                time.sleep(0.001)
+            else:
+                latencies[flag].append(time.perf_counter() - tic)
+        sampling.set()
+        sampler.join()
+
+        result["edge_to_ack"] = {
+            "teach": summarize(latencies[TEACH_SEED]),
+            "set": summarize(latencies[SET_SEED]),
+            "all": summarize(latencies[TEACH_SEED] + latencies[SET_SEED]),
+            "timeouts": timeouts,
+            "rpc_set_seed_calls": len(stand_ins.rpc.seeds) - sets_before,
+        }
+        result["seed0_age"] = summarize(ages)
+    except Exception as e:
+        result["error"] = repr(e)
+    finally:
+        process.terminate()
+        process.wait(10)
+        wall = time.monotonic() - started
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        target.close()
+        stand_ins.stop()
+
+    user = after.ru_utime - usage.ru_utime
+    system = after.ru_stime - usage.ru_stime
+    result["cpu"] = {
+        "user_s": user,
+        "system_s": system,
+        "wall_s": wall,
+        "percent": (user + system) / wall * 100.0,
+    }
+    if "error" in result or args.keep:
+        result["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="end-to-end benchmark of the bridges against local stand-ins",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--bridges",
+        nargs="+",
+        choices=list(BRIDGES),
+        default=list(BRIDGES),
+        help="bridges to run, one after another",
+    )
+    parser.add_argument(
+        "--edges", type=int, default=20, help="teachSeed/setSeed edges per bridge"
+    )
+    parser.add_argument(
+        "--frq", type=float, default=100.0, help="frequency of the replayed poses"
+    )
+    parser.add_argument(
+        "--rpc_latency",
+        type=float,
+        default=0.0,
+        help="seconds added to every JSON RPC call",
+    )
+    parser.add_argument(
+        "--sample_interval",
+        type=float,
+        default=0.02,
+        help="seconds between samples of seed 0",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=15.0,
+        help="seconds to wait for the bridge to start or to clear a flag",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default=os.path.join(REPO, "config.json"),
+        help="bridge configuration; hosts and ports are replaced by the stand-ins",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="device_seed",
+        help="device of cfg/modbus_slave.json to simulate",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the edge timing")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the working directories and logs"
+    )
+    parser.add_argument(
+        "--output", type=str, help="write the results to this file as well"
+    )
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        args.base_config = json.load(f)
+    with open(os.path.join(REPO, "cfg", "modbus_slave.json"), "r") as f:
+        device = json.load(f)["device_list"][args.device]
+
+    results = {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "edges": args.edges,
+        "frq": args.frq,
+        "rpc_latency": args.rpc_latency,
+        "bridges": [],
+    }
+    for name in args.bridges:
+        if name != "seed_sqlite" and ModbusSimulatorContext is None:
+            results["bridges"].append({"bridge": name, "error": "pymodbus missing"})
+            continue
+        results["bridges"].append(run_bridge(name, args, device))
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Read-back check and benchmark of s7_map.py against the server of python-snap7:
+# write poses and clear flags through SeedBlockMap, read the data block back,
+# then time one poll of the flags against reading the whole block.
+#
+# python test/bench_s7_map.py --seed_num 8
+
+import argparse
+import ctypes
+import os
+import struct
+import sys
+import timeit
+
+import snap7
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import seed_s7  # noqa: E402
+from s7_map import SeedBlockMap  # noqa: E402
+
+try:
+    from snap7.types import SrvArea
+except ImportError:  # python-snap7 2.x and 3.x
+    from snap7.type import SrvArea
+
+
+def serve(db_number: int, size: int, port: int):
+    """A snap7 server with one data block, returned with the block's memory"""
+    db = bytearray(size)
+    server = snap7.server.Server()
+    try:  # python-snap7 3.x keeps a bytearray as it is
+        server.register_area(SrvArea.DB, db_number, db)
+    except TypeError:  # 1.x and 2.x share the memory of a ctypes array
+        server.register_area(
+            SrvArea.DB, db_number, (ctypes.c_uint8 * size).from_buffer(db)
+        )
+    server.start(tcp_port=port)
+    return server, db
+
+
+def check(client, db, blockmap: SeedBlockMap):
+    """What SeedBlockMap writes has to be in the data block, failures raise"""
+    row = blockmap.row_size
+    flags = blockmap.control_start
+    # seed 3 requests to be set with enforceSeed, seed 5 to be taught
+    db[3 * row] = 0b01
+    struct.pack_into(">ddd", db, 3 * row + 2, 1.5, -2.5, 3.0)
+    db[3 * row + flags] = 0b10
+    db[5 * row + flags] = 0b01
+    controls = blockmap.read_controls(client)
+    empty = bytes(len(controls))
+    assert blockmap.rising(empty, controls, "setSeed") == [3]
+    assert blockmap.rising(empty, controls, "recordSeed") == [5]
+    assert blockmap.read_seeds(client, [3]) == {3: (1.5, -2.5, 3.0, True, False)}
+
+    blockmap.write_poses(client, [5, 6], 4.0, 5.0, 6.0)
+    for i in (5, 6):
+        assert struct.unpack_from(">ddd", db, i * row + 2) == (4.0, 5.0, 6.0)
+    assert struct.unpack_from(">ddd", db, 3 * row + 2) == (1.5, -2.5, 3.0)
+
+    blockmap.clear_flags(client, [(3, "setSeed"), (5, "recordSeed")])
+    # the server of python-snap7 3.x writes a bit as the whole byte, a PLC
+    # writes only the bit, so only the cleared flags are checked
+    assert not db[3 * row + flags] & 0b10
+    assert not db[5 * row + flags] & 0b01
+
+    # writes to a data block that does not exist have to raise
+    missing = SeedBlockMap(
+        blockmap.db_number + 1,
+        blockmap.seed_num,
+        row,
+        seed_s7.layout,
+        blockmap.pdu_length,
+    )
+    for write in (
+        lambda: missing.write_poses(client, [1], 1.0, 2.0, 3.0),
+        lambda: missing.clear_flags(client, [(1, "setSeed")]),
+    ):
+        try:
+            write()
+        except seed_s7.S7_ERRORS:
+            continue
+        raise AssertionError("a failed write was not reported")
+    print("read-back check passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="read-back check of s7_map.py")
+    parser.add_argument("--seed_num", type=int, default=8, help="number of seeds")
+    parser.add_argument("--port", type=int, default=11102, help="port of the server")
+    parser.add_argument("--number", type=int, default=200, help="polls per run")
+    args = parser.parse_args()
+
+    size = args.seed_num * seed_s7.ROW_SIZE
+    server, db = serve(seed_s7.DB_NUMBER, size, args.port)
+    client = snap7.client.Client()
+    try:
+        client.connect("127.0.0.1", 0, 1, args.port)
+        blockmap = SeedBlockMap(
+            seed_s7.DB_NUMBER,
+            args.seed_num,
+            seed_s7.ROW_SIZE,
+            seed_s7.layout,
+            client.get_pdu_length(),
+        )
+        check(client, db, blockmap)
+        for label, poll in (
+            ("flags, read_multi_vars", lambda: blockmap.read_controls(client)),
+            (
+                "whole block, db_read",
+                lambda: client.db_read(seed_s7.DB_NUMBER, 0, size),
+            ),
+        ):
+            seconds = min(timeit.repeat(poll, number=args.number, repeat=3))
+            print(f"{label:<24} {seconds / args.number * 1e3:8.3f} ms/poll")
+    finally:
+        client.disconnect()
+        server.stop()
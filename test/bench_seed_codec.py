@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Created On: 2026-10-18
+# SPDX-FileCopyrightText: Copyright (c) 2023 Shanghai Bosch Rexroth Hydraulics & Automation Ltd.
+# SPDX-License-Identifier: MIT
+#
+# Micro-benchmark of one teach_or_set_seed poll cycle: decode the control bits of
+# all seeds and the poses of all seeds, then encode the bits again.
+#
+# python test/bench_seed_codec.py --seed_num 16
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import seed_codec  # noqa: E402
+
+try:
+    from bitstring import BitArray
+    from pymodbus.payload import BinaryPayloadBuilder, BinaryPayloadDecoder
+except ImportError:
+    BitArray = None
+
+
+# the codec of seed_modbus.py before seed_codec.py, for comparison
+
+
+def legacy_decode_bits(registers):
+    bits_list = []
+    bits = BitArray()
+    for register in registers:
+        bit_16 = BitArray(uint=register, length=16)
+        bit_16.reverse()
+        bits.append(bit_16)
+    for bit_4 in bits.cut(4):
+        bits_list.append([bit == "1" for bit in bit_4.bin])
+    return bits_list
+
+
+def legacy_encode_bits(bits_list, byte_order, word_order):
+    bits = BitArray()
+    for bool_val in [item for sublist in bits_list for item in sublist]:
+        bits.append("0b1" if bool_val else "0b0")
+    builder = BinaryPayloadBuilder(byteorder=byte_order, wordorder=word_order)
+    for bits_16 in bits.cut(16):
+        bits_16.reverse()
+        builder.add_16bit_uint(bits_16.uint)
+    return builder.to_registers()
+
+
+def legacy_decode_pose(registers, byte_order, word_order):
+    decoder = BinaryPayloadDecoder.fromRegisters(
+        registers, byteorder=byte_order, wordorder=word_order
+    )
+    return [decoder.decode_32bit_float() for _ in range(3)]
+
+
+def legacy_encode_pose(pose, byte_order, word_order):
+    builder = BinaryPayloadBuilder(byteorder=byte_order, wordorder=word_order)
+    builder.add_32bit_float(pose.x)
+    builder.add_32bit_float(pose.y)
+    builder.add_32bit_float(pose.yaw)
+    return builder.to_registers()
+
+
+def check(seed_num):
+    """The new codec has to produce the registers and values of the legacy one"""
+    bit_registers = [random.getrandbits(16) for _ in range(-(-seed_num // 4))]
+    bits = seed_codec.decode_bits(bit_registers)
+    assert bits == legacy_decode_bits(bit_registers)
+    # bit registers are not byte swapped, the legacy writer did so for "<"
+    assert seed_codec.encode_bits(bits) == legacy_encode_bits(bits, ">", ">")
+    if seed_codec.np is not None:
+        assert seed_codec.decode_bits_array(bit_registers).tolist() == bits
+        assert seed_codec.encode_bits_array(bits) == bit_registers
+    for byte_order in "<>":
+        for word_order in "<>":
+            pose = SimpleNamespace(
+                x=random.uniform(-100, 100),
+                y=random.uniform(-100, 100),
+                yaw=random.uniform(-3.2, 3.2),
+            )
+            registers = legacy_encode_pose(pose, byte_order, word_order)
+            assert seed_codec.encode_pose(pose, byte_order, word_order) == registers
+            assert seed_codec.decode_pose(
+                registers, byte_order, word_order
+            ) == legacy_decode_pose(registers, byte_order, word_order)
+
+
+def bench(label, cycle, number):
+    seconds = min(timeit.repeat(cycle, number=number, repeat=5)) / number
+    print(f"{label:<28} {seconds * 1e6:10.1f} us/cycle")
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark of the seed codec")
+    parser.add_argument("--seed_num", type=int, default=16, help="number of seeds")
+    parser.add_argument("--number", type=int, default=2000, help="cycles per run")
+    args = parser.parse_args()
+
+    seed_num = args.seed_num
+    bit_registers = [random.getrandbits(16) for _ in range(-(-seed_num // 4))]
+    pose_registers = [random.getrandbits(16) for _ in range(6 * seed_num)]
+    bo, wo = ">", "<"
+
+    def new_cycle():
+        bits = seed_codec.decode_bits(bit_registers)
+        seed_codec.decode_poses(pose_registers, bo, wo)
+        seed_codec.encode_bits(bits, bo, wo)
+
+    def numpy_cycle():
+        bits = seed_codec.decode_bits_array(bit_registers)
+        seed_codec.decode_poses_array(pose_registers, bo, wo)
+        seed_codec.encode_bits_array(bits)
+
+    def legacy_cycle():
+        bits = legacy_decode_bits(bit_registers)
+        for i in range(seed_num):
+            legacy_decode_pose(pose_registers[6 * i : 6 * i + 6], bo, wo)
+        legacy_encode_bits(bits, bo, wo)
+
+    print(f"seed_num={seed_num}")
+    new = bench("seed_codec", new_cycle, args.number)
+    if seed_codec.np is not None:
+        bench("seed_codec, NumPy batch", numpy_cycle, args.number)
+    if BitArray is not None:
+        check(seed_num)
+        legacy = bench("bitstring + payload (legacy)", legacy_cycle, args.number // 10)
+        print(f"speed-up {legacy / new:.1f}x")